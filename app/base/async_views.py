@@ -0,0 +1,144 @@
+"""
+Async read path for DRF viewsets.
+
+DRF views are synchronous, so under the ASGI worker every request is run in a
+thread through `sync_to_async`. Viewsets that mix in `AsyncReadMixin` get
+`alist`/`aretrieve` handlers that fetch rows with the async ORM, and the
+routes built by `async_read_view` (see `base.routers.AsyncReadRouter`) call
+them directly on the event loop for GET requests. Every other method still
+goes to the regular DRF view.
+
+Querysets, filters, permissions and serializers are the same as on the sync
+path. Serialization stays synchronous, so everything a serializer touches has
+to be loaded while fetching (select_related/prefetch_related, or
+`aprepare_objects`); a lazy query raises SynchronousOnlyOperation.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+
+class AsyncReadMixin:
+    async def adispatch(self, request, *args, **kwargs):
+        """Async counterpart of `APIView.dispatch` for the mapped action."""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        return await self.arender(response)
+
+    async def aperform_authentication(self, request):
+        """
+        Resolve `request.user` up front, so `initial()` and the handlers never
+        query for it. Authenticators can provide `aauthenticate`; the others
+        are run in a thread.
+        """
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, "aauthenticate", None)
+            if authenticate is None:
+                authenticate = sync_to_async(authenticator.authenticate)
+            try:
+                user_auth = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._not_authenticated()
+
+    async def arender(self, response):
+        """
+        Render here instead of letting the handler do it in a thread, and
+        hand back a plain HttpResponse.
+        """
+        if not isinstance(response, SimpleTemplateResponse):
+            return response
+        response.render()
+        for callback in getattr(response, "async_post_render_callbacks", ()):
+            await callback(response)
+
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    async def afilter_queryset(self, queryset):
+        return self.filter_queryset(queryset)
+
+    async def aprepare_objects(self, objects):
+        """Load whatever the serializer needs for `objects` but can't prefetch."""
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        obj = await queryset.filter(**lookup).afirst()
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        if self.paginator is None:
+            objects = [obj async for obj in queryset]
+        else:
+            objects = await self.paginator.apaginate_queryset(
+                queryset, request, view=self
+            )
+        await self.aprepare_objects(objects)
+
+        serializer = self.get_serializer(objects, many=True)
+        if self.paginator is None:
+            return Response(serializer.data)
+        return self.paginator.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        await self.aprepare_objects([instance])
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+
+def async_read_view(view):
+    """
+    Wrap a viewset view built by `as_view(actions)` so GET requests whose
+    action has an async handler (`alist` for `list`, ...) are served on the
+    event loop. The wrapper keeps the `cls`, `initkwargs` and `actions`
+    attributes that schema generation and the query budgets read.
+    """
+    cls, initkwargs, actions = view.cls, view.initkwargs, view.actions
+    sync_view = sync_to_async(view)
+
+    async def async_view(request, *args, **kwargs):
+        action = actions.get(request.method.lower())
+        if request.method != "GET" or not hasattr(cls, f"a{action}"):
+            return await sync_view(request, *args, **kwargs)
+
+        self = cls(**initkwargs)
+        self.action_map = actions
+        return await self.adispatch(request, *args, **kwargs)
+
+    async_view.__name__ = view.__name__
+    async_view.__doc__ = view.__doc__
+    async_view.cls = cls
+    async_view.initkwargs = initkwargs
+    async_view.actions = actions
+    # csrf_exempt() wraps in a sync function on this Django version
+    async_view.csrf_exempt = True
+    return async_view
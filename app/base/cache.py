@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from rest_framework import status
+
+# Validators of base.conditional, replayed on hits
+CACHED_HEADERS = ("ETag", "Last-Modified", "Vary")
+
+
+def is_process_local(cache):
+    """Whether writes to `cache` are only seen by the current process."""
+    return isinstance(cache, LocMemCache)
+
+
+class ResponseCache:
+    """
+    Read-through cache for rendered GET responses of anonymous users.
+
+    Entries live in the cache alias named by RESPONSE_CACHE_ALIAS, so the
+    backend can be the in-process LocMemCache (LRU) or a shared Redis cache.
+    Every key embeds a version stored per (action, lookup); writers invalidate
+    all variants of a list or of one object by replacing that version instead
+    of scanning keys.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.metrics = {"hit": 0, "miss": 0, "invalidation": 0}
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+    @property
+    def timeout(self):
+        return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 60)
+
+    def get_version_key(self, action, lookup=None):
+        return f"{self.prefix}:{action}:{lookup or ''}:version"
+
+    def get_key(self, request, action, lookup=None):
+        version = self.cache.get(self.get_version_key(action, lookup), 0)
+        return self.build_key(request, action, lookup, version)
+
+    async def aget_key(self, request, action, lookup=None):
+        version = await self.cache.aget(self.get_version_key(action, lookup), 0)
+        return self.build_key(request, action, lookup, version)
+
+    def build_key(self, request, action, lookup, version):
+        params = urlencode(sorted(request.query_params.lists()), doseq=True)
+        digest = hashlib.md5(
+            f"{request.get_host()}:{request.accepted_media_type}?{params}".encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return f"{self.prefix}:{action}:{lookup or ''}:{version}:{digest}"
+
+    def record(self, metric):
+        with self.lock:
+            self.metrics[metric] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.metrics)
+
+    def hit(self, cached):
+        self.record("hit")
+        content, content_type, *headers = cached
+        response = HttpResponse(content, content_type=content_type)
+        for header, value in (headers[0] if headers else {}).items():
+            response[header] = value
+        response["X-Cache"] = "HIT"
+        return response
+
+    def entry(self, rendered):
+        headers = {
+            header: rendered[header]
+            for header in CACHED_HEADERS
+            if rendered.has_header(header)
+        }
+        return rendered.content, rendered["Content-Type"], headers
+
+    def fetch(self, key, handler):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.hit(cached)
+
+        self.record("miss")
+        response = handler()
+        response["X-Cache"] = "MISS"
+        if response.status_code == status.HTTP_200_OK:
+            response.add_post_render_callback(
+                lambda rendered: self.cache.set(key, self.entry(rendered), self.timeout)
+            )
+        return response
+
+    async def afetch(self, key, handler):
+        """`fetch` for async handlers, storing through the async cache API."""
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return self.hit(cached)
+
+        self.record("miss")
+        response = await handler()
+        response["X-Cache"] = "MISS"
+        if response.status_code == status.HTTP_200_OK:
+            # Run by AsyncReadMixin.arender() once the response is rendered
+            response.async_post_render_callbacks = [
+                lambda rendered: self.cache.aset(
+                    key, self.entry(rendered), self.timeout
+                )
+            ]
+        return response
+
+    def invalidate(self, action, lookup=None):
+        self.record("invalidation")
+        self.cache.set(self.get_version_key(action, lookup), time.time_ns(), None)
+
+    def invalidate_many(self, action, lookups):
+        """`invalidate` for several lookups of `action` in one cache write."""
+        version = time.time_ns()
+        keys = {self.get_version_key(action, lookup): version for lookup in lookups}
+        if keys:
+            self.record("invalidation")
+            self.cache.set_many(keys, None)
+
+
+class CachedResponseMixin:
+    """
+    Serve `cached_actions` of anonymous requests through `response_cache`, and
+    of every request when `cache_authenticated` is set (responses that don't
+    depend on the user).
+    """
+
+    response_cache: ResponseCache
+    cached_actions = ("list", "retrieve")
+    cache_authenticated = False
+
+    def is_cached(self, request):
+        if request.user.is_authenticated and not self.cache_authenticated:
+            return False
+        return self.action in self.cached_actions
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cached(request):
+            return handler(request, *args, **kwargs)
+
+        lookup = self.kwargs.get(self.lookup_field) if self.detail else None
+        key = self.response_cache.get_key(request, self.action, lookup)
+        return self.response_cache.fetch(key, lambda: handler(request, *args, **kwargs))
+
+    async def aget_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cached(request):
+            return await handler(request, *args, **kwargs)
+
+        lookup = self.kwargs.get(self.lookup_field) if self.detail else None
+        key = await self.response_cache.aget_key(request, self.action, lookup)
+        return await self.response_cache.afetch(
+            key, lambda: handler(request, *args, **kwargs)
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aget_cached_response(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aget_cached_response(
+            super().aretrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,103 @@
+"""
+Column selection derived from serializers.
+
+`select_columns` narrows a queryset to the columns a serializer renders: its
+model fields, the foreign keys behind related fields, and the columns of
+nested serializers and dotted sources, which are joined with select_related.
+Large columns the serializer doesn't show (e.g. a post's body) are never
+read. SerializerMethodFields and other `source="*"` fields only get the pk,
+and to-many relations are left to prefetch_related.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def resolve(model, attrs, prefix=""):
+    """
+    Return the (only, select_related) lookups reading the `attrs` path of a
+    source from `model`, or None when it isn't made of model fields.
+    """
+    only, related = set(), set()
+    for index, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if field.many_to_many or field.one_to_many:
+            return None
+        if not field.is_relation or index == len(attrs) - 1:
+            only.add(f"{prefix}{field.attname if field.is_relation else attr}")
+            break
+        only.add(f"{prefix}{field.name}")
+        related.add(f"{prefix}{field.name}")
+        model, prefix = field.related_model, f"{prefix}{field.name}__"
+    return only, related
+
+
+def get_columns(serializer, model, prefix=""):
+    """Return the (only, select_related) lookups read by `serializer`."""
+    only, related = set(), set()
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer):
+                continue
+            try:
+                relation = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if relation.is_relation and not (
+                relation.many_to_many or relation.one_to_many
+            ):
+                lookup = f"{prefix}{relation.name}"
+                nested_only, nested_related = get_columns(
+                    field, relation.related_model, f"{lookup}__"
+                )
+                only |= {lookup, *nested_only}
+                related |= {lookup, *nested_related}
+            continue
+        columns = resolve(model, field.source_attrs, prefix)
+        if columns is not None:
+            only |= columns[0]
+            related |= columns[1]
+    return only, related
+
+
+def select_columns(queryset, serializer, extra=()):
+    """
+    Load only the columns of `queryset` read by `serializer`, plus the `extra`
+    field names (e.g. the keys of a keyset pagination).
+    """
+    only, related = get_columns(serializer, queryset.model)
+    for name in extra:
+        columns = resolve(queryset.model, name.split("__"))
+        if columns is not None:
+            only |= columns[0]
+            related |= columns[1]
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only))
+
+
+class SerializerColumnsMixin:
+    """
+    Load only the columns rendered by the serializer for `column_actions`,
+    plus the pagination ordering and the `version_fields` of
+    base.conditional, instead of whole rows.
+    """
+
+    column_actions = ("list",)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.column_actions:
+            return queryset
+        return self.select_columns(queryset)
+
+    def select_columns(self, queryset):
+        ordering = ()
+        if hasattr(self.paginator, "get_ordering"):
+            ordering = [name.lstrip("-") for name in self.paginator.get_ordering(self)]
+        extra = [*ordering, *getattr(self, "version_fields", ())]
+        return select_columns(queryset, self.get_serializer(), extra=extra)
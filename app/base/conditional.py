@@ -0,0 +1,155 @@
+"""
+Conditional GET (ETag / Last-Modified) from version columns.
+
+The ETag of a response is a digest of the `version_fields` of the rows it
+renders, its page links and the requesting user (for per-user fields), so it
+is known without rendering anything. Requests carrying If-None-Match or
+If-Modified-Since first read only those columns of the same rows, through the
+same queryset and pagination, and get a 304 when nothing moved. The other
+responses get the headers from the objects they serialized.
+
+Version fields must move whenever something rendered changes, e.g. an
+`updated_at` also bumped by counter updates. Details also send Last-Modified;
+lists don't, since a row leaving the page doesn't move any date.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+
+
+class ConditionalListMixin:
+    """Answer conditional requests of `conditional_actions` with a 304."""
+
+    conditional_actions = ("list",)
+    version_fields = ("updated_at",)
+
+    def get_serializer(self, *args, **kwargs):
+        if args and self.action in self.conditional_actions:
+            self.rendered = args[0] if self.action == "list" else [args[0]]
+        return super().get_serializer(*args, **kwargs)
+
+    def get_version_queryset(self):
+        """Return the queryset of the rows rendered by the action, or None."""
+        if self.action == "list":
+            if not hasattr(self.paginator, "get_page_queryset"):
+                return None
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginator.get_page_queryset(queryset, self.request, self)
+            return page[: self.paginator.page_size + 1]
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        return self.get_queryset().filter(**lookup)[:1]
+
+    def versions_of(self, queryset):
+        return queryset.prefetch_related(None).values_list("pk", *self.version_fields)
+
+    def read_versions(self, rows):
+        if self.action == "list":
+            return self.paginator.set_page(rows)
+        return rows or None
+
+    def get_versions(self):
+        queryset = self.get_version_queryset()
+        if queryset is None:
+            return None
+        return self.read_versions(list(self.versions_of(queryset)))
+
+    async def aget_versions(self):
+        queryset = self.get_version_queryset()
+        if queryset is None:
+            return None
+        return self.read_versions([row async for row in self.versions_of(queryset)])
+
+    def get_validators(self, rows):
+        """Return the ETag and Last-Modified timestamp of a response of `rows`."""
+        links = None
+        if self.action == "list":
+            links = (self.paginator.has_next, self.paginator.has_previous)
+        user = self.request.user
+        state = (
+            self.request.accepted_renderer.format,
+            user.pk if user and user.is_authenticated else None,
+            sorted(rows),
+            links,
+        )
+        etag = hashlib.md5(repr(state).encode(), usedforsecurity=False).hexdigest()
+
+        last_modified = None
+        if self.action != "list" and "updated_at" in self.version_fields:
+            updated_at = rows[0][1 + self.version_fields.index("updated_at")]
+            last_modified = int(updated_at.timestamp())
+        return quote_etag(etag), last_modified
+
+    def set_validators(self, response, etag, last_modified):
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def not_modified(self, request, rows):
+        etag, last_modified = self.get_validators(rows)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            return None
+        return self.set_validators(response, etag, last_modified)
+
+    def add_validators(self, response):
+        rendered = getattr(self, "rendered", None)
+        if response.status_code != status.HTTP_200_OK or rendered is None:
+            return response
+        rows = [
+            (obj.pk, *(getattr(obj, field) for field in self.version_fields))
+            for obj in rendered
+        ]
+        return self.set_validators(response, *self.get_validators(rows))
+
+    def is_conditional(self, request):
+        return self.action in self.conditional_actions and any(
+            header in request.META
+            for header in ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE")
+        )
+
+    def get_conditional_response(self, handler, request, *args, **kwargs):
+        if self.is_conditional(request):
+            rows = self.get_versions()
+            if rows is not None:
+                response = self.not_modified(request, rows)
+                if response is not None:
+                    return response
+        return self.add_validators(handler(request, *args, **kwargs))
+
+    async def aget_conditional_response(self, handler, request, *args, **kwargs):
+        if self.is_conditional(request):
+            rows = await self.aget_versions()
+            if rows is not None:
+                response = self.not_modified(request, rows)
+                if response is not None:
+                    return response
+        return self.add_validators(await handler(request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().list, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aget_conditional_response(
+            super().alist, request, *args, **kwargs
+        )
+
+
+class ConditionalResponseMixin(ConditionalListMixin):
+    """`ConditionalListMixin` for both list and retrieve."""
+
+    conditional_actions = ("list", "retrieve")
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().retrieve, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aget_conditional_response(
+            super().aretrieve, request, *args, **kwargs
+        )
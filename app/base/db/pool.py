@@ -0,0 +1,179 @@
+"""
+Bounded pool of raw DB-API connections, one per database and worker process.
+
+Django keeps one connection per thread, which under ASGI means one per
+request thread. With a pool, the backend hands its connection back at the
+end of every request instead of closing it, and the next request on any
+thread reuses it. At most MAX_SIZE connections are open; callers beyond that
+wait up to TIMEOUT seconds for one to be returned.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Idle connections of the parent process, see _reset_after_fork()
+_inherited = []
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size, timeout=10.0, max_age=None, check_idle=30.0):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        # (connection, opened_at, released_at), most recently released last
+        self.idle = deque()
+        self.opened_at = {}
+        self.metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+            "timeouts": 0,
+            "opened": 0,
+            "discarded": 0,
+        }
+
+    def acquire(self, is_usable):
+        """
+        Return an idle connection or open a new one, waiting for a free slot
+        when MAX_SIZE connections are checked out. Connections older than
+        `max_age` are discarded, and ones idle for longer than `check_idle`
+        seconds are checked with `is_usable(connection)` first.
+        """
+        started = time.monotonic()
+        if not self.slots.acquire(blocking=False):
+            if not self.slots.acquire(timeout=self.timeout):
+                with self.lock:
+                    self.metrics["timeouts"] += 1
+                raise PoolTimeout(
+                    f"No database connection freed up within {self.timeout}s "
+                    f"({self.max_size} in use)"
+                )
+            waited = (time.monotonic() - started) * 1000
+            with self.lock:
+                self.metrics["waits"] += 1
+                self.metrics["wait_ms_total"] += waited
+                self.metrics["wait_ms_max"] = max(self.metrics["wait_ms_max"], waited)
+            logger.debug("Waited %.2fms for a database connection", waited)
+
+        try:
+            connection = self.get_idle(is_usable)
+            if connection is None:
+                connection = self.connect()
+                with self.lock:
+                    self.opened_at[id(connection)] = time.monotonic()
+                    self.metrics["opened"] += 1
+        except BaseException:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.metrics["checkouts"] += 1
+        return connection
+
+    def get_idle(self, is_usable):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, opened_at, released_at = self.idle.pop()
+
+            now = time.monotonic()
+            if self.max_age is not None and now - opened_at >= self.max_age:
+                self.discard(connection)
+            elif connection.closed or (
+                now - released_at >= self.check_idle and not is_usable(connection)
+            ):
+                self.discard(connection)
+            else:
+                return connection
+
+    def release(self, connection, reusable=True):
+        """Return a checked out connection, closing it if it isn't `reusable`."""
+        try:
+            if reusable and not connection.closed:
+                with self.lock:
+                    opened_at = self.opened_at.get(id(connection))
+                    if opened_at is not None:
+                        self.idle.append((connection, opened_at, time.monotonic()))
+                        return
+            self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def discard(self, connection):
+        with self.lock:
+            self.opened_at.pop(id(connection), None)
+            self.metrics["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            logger.debug("Failed to close a pooled connection", exc_info=True)
+
+    def clear(self):
+        """Close every idle connection."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+        for connection, _, _ in idle:
+            self.discard(connection)
+
+    def stats(self):
+        with self.lock:
+            in_use = len(self.opened_at) - len(self.idle)
+            return {
+                **self.metrics,
+                "max_size": self.max_size,
+                "size": len(self.opened_at),
+                "idle": len(self.idle),
+                "in_use": in_use,
+                "saturation": in_use / self.max_size,
+            }
+
+
+def get_pool(key, **kwargs):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**kwargs)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.clear()
+
+
+def pool_stats():
+    """Return {database name: stats} for every pool of this process."""
+    with _pools_lock:
+        return {key[0]: pool.stats() for key, pool in _pools.items()}
+
+
+def _reset_after_fork():
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    # A forked child shares the parent's sockets. Start with empty pools, and
+    # keep the inherited connections referenced so they are never closed (or
+    # garbage collected) from the child, which would end the parent's session.
+    for pool in _pools.values():
+        _inherited.extend(pool.idle)
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
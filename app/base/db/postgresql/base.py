@@ -0,0 +1,94 @@
+"""
+PostgreSQL backend with a per-process connection pool (see base.db.pool).
+
+Enabled by a POOL entry in the database settings:
+
+    "POOL": {"MAX_SIZE": 5, "TIMEOUT": 10, "CHECK_IDLE": 30}
+
+CONN_MAX_AGE then bounds the lifetime of pooled connections rather than of a
+thread's connection, and CONN_HEALTH_CHECKS makes checkouts of connections
+idle for more than CHECK_IDLE seconds run a `SELECT 1` first. Without POOL
+the backend behaves exactly like Django's.
+"""
+import json
+
+from django.db.backends.postgresql import base
+
+from .. import pool as pools
+from .creation import DatabaseCreation
+
+# libpq's PQTRANS_IDLE, the same value on psycopg2 and psycopg 3
+TRANSACTION_STATUS_IDLE = 0
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool_settings(self):
+        return self.settings_dict.get("POOL") or {}
+
+    def get_pool(self, conn_params):
+        settings = self.pool_settings
+        if not settings.get("MAX_SIZE"):
+            return None
+        # The test runner reconnects the same alias to another database
+        key = (self.alias, json.dumps(conn_params, sort_keys=True, default=str))
+        return pools.get_pool(
+            key,
+            connect=lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            max_size=settings["MAX_SIZE"],
+            timeout=settings.get("TIMEOUT", 10.0),
+            max_age=self.settings_dict["CONN_MAX_AGE"],
+            check_idle=(
+                settings.get("CHECK_IDLE", 30.0)
+                if self.settings_dict["CONN_HEALTH_CHECKS"]
+                else float("inf")
+            ),
+        )
+
+    def get_new_connection(self, conn_params):
+        self.connection_pool = self.get_pool(conn_params)
+        if self.connection_pool is None:
+            return super().get_new_connection(conn_params)
+        return self.connection_pool.acquire(self.is_usable_connection)
+
+    def is_usable_connection(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if getattr(self, "connection_pool", None) is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            self.connection_pool.release(
+                self.connection, reusable=self.reset_connection()
+            )
+
+    def reset_connection(self):
+        """Leave no transaction open on a connection going back to the pool."""
+        if self.errors_occurred or self.connection.closed:
+            return False
+        try:
+            if self.connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                self.connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Hand the connection back at the end of every request, the pool
+        # takes care of reuse and of CONN_MAX_AGE
+        if (
+            self.connection is not None
+            and getattr(self, "connection_pool", None) is not None
+            and not self.in_atomic_block
+        ):
+            self.close()
@@ -0,0 +1,244 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from post.cache import post_cache
+from post.models import Post, Reaction
+from rest_framework.test import APIClient
+
+from ...db.pool import pool_stats
+from .populatedb import populate_database
+
+User = get_user_model()
+
+BENCH_USER = {
+    "username": "benchmark-user",
+    "password": "benchmark-password",
+    "full_name": "Benchmark User",
+}
+
+# (scenario, weight) of the request mix replayed against the API
+SCENARIOS = [
+    ("post_list", 30),
+    ("post_list_auth", 10),
+    ("post_detail", 20),
+    ("comment_list", 15),
+    ("reaction_toggle", 10),
+    ("user_detail", 10),
+    ("token", 5),
+]
+
+
+def percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_host():
+    """Return a host the API accepts with the current ALLOWED_HOSTS."""
+    hosts = [host.lstrip(".") for host in settings.ALLOWED_HOSTS if host != "*"]
+    if hosts:
+        return hosts[0]
+    # An empty list accepts localhost in DEBUG only, "*" accepts anything
+    return (
+        "localhost" if settings.DEBUG and not settings.ALLOWED_HOSTS else "testserver"
+    )
+
+
+class Benchmark:
+    def __init__(self, sample_size=1000, seed=None):
+        self.random = random.Random(seed)
+        host = get_host()
+        self.anonymous = APIClient(SERVER_NAME=host)
+        self.client = APIClient(SERVER_NAME=host)
+
+        user = User.objects.filter(username=BENCH_USER["username"]).first()
+        if user is None:
+            user = User.objects.create_user(**BENCH_USER)  # type: ignore
+        # Start every run from the same state for the reaction toggles
+        Reaction.objects.filter(user=user).delete()
+        response = self.anonymous.post("/api/v1/token/", BENCH_USER, format="json")
+        if response.status_code != 200:
+            raise CommandError(
+                f"Could not get a token ({response.status_code}): "
+                f"{response.content.decode()[:200]}"
+            )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        published = Post.objects.filter(is_published=True)
+        self.slugs = list(published.values_list("slug", flat=True)[:sample_size])
+        self.usernames = list(
+            User.objects.values_list("username", flat=True)[:sample_size]
+        )
+        self.reacted = set()
+
+    def request(self, scenario):
+        slug = self.random.choice(self.slugs)
+        if scenario == "post_list":
+            return self.anonymous.get("/api/v1/posts/")
+        if scenario == "post_list_auth":
+            return self.client.get("/api/v1/posts/")
+        if scenario == "post_detail":
+            return self.anonymous.get(f"/api/v1/posts/{slug}/")
+        if scenario == "comment_list":
+            return self.anonymous.get(f"/api/v1/posts/{slug}/comments/")
+        if scenario == "reaction_toggle":
+            if slug in self.reacted:
+                self.reacted.discard(slug)
+                return self.client.delete(f"/api/v1/posts/{slug}/reactions/remove/")
+            self.reacted.add(slug)
+            return self.client.post(f"/api/v1/posts/{slug}/reactions/")
+        if scenario == "user_detail":
+            username = self.random.choice(self.usernames)
+            return self.anonymous.get(f"/api/v1/users/{username}/")
+        if scenario == "token":
+            return self.anonymous.post("/api/v1/token/", BENCH_USER, format="json")
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    def run(self, total_requests, warmup=0):
+        names = [name for name, _ in SCENARIOS]
+        weights = [weight for _, weight in SCENARIOS]
+        plan = self.random.choices(names, weights=weights, k=warmup + total_requests)
+
+        latencies = defaultdict(list)
+        queries = defaultdict(list)
+        errors = defaultdict(int)
+        started = time.perf_counter()
+        for index, scenario in enumerate(plan):
+            if index == warmup:
+                latencies.clear()
+                queries.clear()
+                errors.clear()
+                started = time.perf_counter()
+
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = self.request(scenario)
+                elapsed = time.perf_counter() - request_started
+            latencies[scenario].append(elapsed * 1000)
+            queries[scenario].append(len(captured))
+            if response.status_code >= 400 and scenario != "reaction_toggle":
+                errors[scenario] += 1
+        total_elapsed = time.perf_counter() - started
+
+        scenarios = {}
+        for name, values in latencies.items():
+            scenarios[name] = {
+                "requests": len(values),
+                "errors": errors[name],
+                "mean_ms": statistics.fmean(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "queries_per_request": statistics.fmean(queries[name]),
+                "throughput_rps": len(values) / sum(values) * 1000,
+            }
+        all_values = [value for values in latencies.values() for value in values]
+        return {
+            "requests": len(all_values),
+            "elapsed_s": total_elapsed,
+            "throughput_rps": len(all_values) / total_elapsed,
+            "p50_ms": percentile(all_values, 50),
+            "p95_ms": percentile(all_values, 95),
+            "p99_ms": percentile(all_values, 99),
+            "scenarios": scenarios,
+            "cache": post_cache.stats(),
+            "pool": pool_stats(),
+        }
+
+
+class Command(BaseCommand):
+    help = "Replay a request mix against the API in-process and report latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--total_user", type=int, default=0)
+        parser.add_argument("--total_post", type=int, default=0)
+        parser.add_argument("--processes", type=int, default=1)
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--output", help="Write the results as JSON")
+        parser.add_argument("--compare", help="JSON results of a previous run")
+
+    def handle(self, *args, **options):
+        if options["total_post"]:
+            populate_database(
+                total_user=max(options["total_user"], 1),
+                total_post=options["total_post"],
+                processes=options["processes"],
+                stdout=self.stdout,
+            )
+        if not Post.objects.filter(is_published=True).exists():
+            self.stderr.write("No published posts, seed with --total_post")
+            return
+
+        post_cache.cache.clear()
+        benchmark = Benchmark(seed=options["seed"])
+        result = benchmark.run(options["requests"], warmup=options["warmup"])
+        result.update(
+            {
+                "revision": git_revision(),
+                "created_at": timezone.now().isoformat(),
+                "dataset": {
+                    "users": User.objects.count(),
+                    "posts": Post.objects.count(),
+                },
+            }
+        )
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+        self.report(result, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(result, file, indent=2)
+
+    def report(self, result, baseline=None):
+        header = (
+            f"{'scenario':<18}{'reqs':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'q/req':>7}"
+        )
+        if baseline:
+            header += f"{'p95 Δ':>9}"
+        self.stdout.write(header)
+
+        for name, stats in sorted(result["scenarios"].items()):
+            line = (
+                f"{name:<18}{stats['requests']:>6}{stats['p50_ms']:>9.2f}"
+                f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+                f"{stats['queries_per_request']:>7.1f}"
+            )
+            previous = baseline and baseline["scenarios"].get(name)
+            if previous:
+                change = (stats["p95_ms"] / previous["p95_ms"] - 1) * 100
+                line += f"{change:>+8.1f}%"
+            self.stdout.write(line)
+
+        self.stdout.write(
+            f"{result['requests']} requests in {result['elapsed_s']:.2f}s, "
+            f"{result['throughput_rps']:.1f} req/s, p95 {result['p95_ms']:.2f}ms"
+        )
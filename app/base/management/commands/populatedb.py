@@ -1,15 +1,25 @@
+import csv
+import io
 import multiprocessing
 import random
+import sys
+import time
 from typing import List
 from uuid import uuid4
 
+from base.utils import allocate_slugs, rand_str
 from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, OutputWrapper
+from django.db import IntegrityError, connection, connections, transaction
 from django.utils import timezone
 from faker import Faker
-from post.models import Comment, Post, Reaction
-
-from base.utils import rand_str
+from post.cache import invalidate_post
+from post.counters import rebuild_counts, rebuild_reply_counts
+from post.excerpts import excerpt_fields
+from post.models import Comment, Post, PostTopic, Reaction
+from post.ranking import rebuild_scores
+from post.search import update_search_vector
+from taggit.models import Tag
 
 fake = Faker()
 User = get_user_model()
@@ -36,130 +46,243 @@ def get_random_weighted_numbers(
     return weighted_numbers
 
 
-def create_users(total_user):
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def copy_rows(model, fields, rows):
+    """
+    Insert `rows` (tuples ordered like `fields`) with PostgreSQL COPY, or with
+    bulk_create on other databases. Signals and auto_now are bypassed.
+    """
+    if connection.vendor != "postgresql":
+        model.objects.bulk_create(
+            [model(**dict(zip(fields, row))) for row in rows],
+            batch_size=WRITE_OPS_LIMIT,
+        )
+        return len(rows)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(quote_name(model._meta.get_field(f).column) for f in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote_name(model._meta.db_table)} ({columns}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    return len(rows)
+
+
+def init_worker():
+    # Forked workers inherit the parent's random state; reseed so they differ
+    random.seed()
+    fake.seed_instance(random.getrandbits(64))
+
+
+def run_stage(name, func, chunks, processes=1, stdout=None):
+    """
+    Run `func` over `chunks`, in a process pool when processes > 1, and report
+    the rate to `stdout` (an OutputWrapper, sys.stdout by default).
+    """
+    started = time.perf_counter()
+    if processes > 1:
+        # Children must open their own connections instead of sharing ours
+        connections.close_all()
+        with multiprocessing.Pool(processes, initializer=init_worker) as pool:
+            results = list(pool.imap_unordered(func, chunks))
+    else:
+        results = [func(chunk) for chunk in chunks]
+
+    rows = sum(result[0] for result in results)
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    stdout = stdout or OutputWrapper(sys.stdout)
+    stdout.write(
+        f"{name}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:.0f} rows/sec)"
+    )
+    return [item for result in results for item in result[1]]
+
+
+def create_users(total_user, batch_size=WRITE_OPS_LIMIT, stdout=None):
     temp_user = User(username="username", full_name="name")
     temp_user.set_password(rand_str(20))
     password = temp_user.password
 
-    user_ops = []
-    for _ in range(total_user):
-        user = fake.simple_profile()
-        user_ops.append(
-            User(username=uuid4().hex, full_name=user["name"], password=password)
+    def create_user_chunk(size):
+        users = User.objects.bulk_create(
+            [
+                User(
+                    username=uuid4().hex,
+                    full_name=fake.simple_profile()["name"],
+                    password=password,
+                )
+                for _ in range(size)
+            ]
         )
+        return len(users), []
 
-    User.objects.bulk_create(user_ops)
-
-    print("User Created")
+    sizes = [len(chunk) for chunk in chunked(range(total_user), batch_size)]
+    run_stage("Users", create_user_chunk, sizes, stdout=stdout)
 
 
-def create_posts(total_post):
-    user_ids = list(User.objects.all().values_list("id", flat=True))
-    for _ in range(total_post):
+def create_post_chunk(args):
+    size, user_ids, tag_ids = args
+    posts = []
+    for _ in range(size):
         description = fake.sentence(
             nb_words=random.randint(100, 500), variable_nb_words=False
         )
-        post = Post.objects.create(
-            author_id=random.choice(user_ids),
-            title=fake.name(),
-            short_description=description[: random.randint(10, 100)],
-            description=description,
-            publish_at=timezone.now(),
+        posts.append(
+            Post(
+                author_id=random.choice(user_ids),
+                title=fake.name(),
+                short_description=description[: random.randint(10, 100)],
+                description=description,
+                **excerpt_fields(description),
+                publish_at=timezone.now(),
+                is_published=True,
+            )
         )
-        post.topics.add(*random.sample(topics, random.randint(1, min(len(topics), 10))))
-    print("Posts Created")
 
-
-def create_reactions():
+    slugs = allocate_slugs(Post, [post.title for post in posts])
+    for attempt in range(3):
+        for post, slug in zip(posts, slugs):
+            # Another worker may be inserting the same slug; suffix on retries
+            post.slug = f"{slug}-{rand_str(6)}" if attempt else slug
+        # Insert in slug order so concurrent workers lock the index in the
+        # same order and collide with an IntegrityError instead of a deadlock
+        posts.sort(key=lambda post: post.slug)
+        try:
+            with transaction.atomic():
+                Post.objects.bulk_create(posts)
+            break
+        except IntegrityError:
+            if attempt == 2:
+                raise
+
+    tagged_items = [
+        PostTopic(content_object_id=post.id, tag_id=tag_id)
+        for post in posts
+        for tag_id in random.sample(tag_ids, random.randint(1, min(len(tag_ids), 10)))
+    ]
+    PostTopic.objects.bulk_create(tagged_items)
+
+    post_ids = [post.id for post in posts]
+    update_search_vector(Post.objects.filter(id__in=post_ids))
+    return len(posts) + len(tagged_items), post_ids
+
+
+def create_posts(total_post, batch_size=WRITE_OPS_LIMIT, processes=1, stdout=None):
     user_ids = list(User.objects.all().values_list("id", flat=True))
-    post_ids = list(Post.objects.all().values_list("id", flat=True))
+    tag_ids = [Tag.objects.get_or_create(name=name)[0].id for name in topics]
 
-    reaction_ops = []
-    for post_id in post_ids:
+    chunks = [
+        (len(chunk), user_ids, tag_ids)
+        for chunk in chunked(range(total_post), batch_size)
+    ]
+    return run_stage("Posts", create_post_chunk, chunks, processes, stdout)
+
+
+def create_reaction_chunk(args):
+    post_ids, user_ids = args
+    now = timezone.now()
+    rows = [
+        (post_id, user_id, now)
+        for post_id in post_ids
         for user_id in random.sample(
             user_ids, random.randint(1, min(len(user_ids), 100))
-        ):
-            reaction_ops.append(Reaction(post_id=post_id, user_id=user_id))
-    Reaction.objects.bulk_create(reaction_ops)
-    print("Reaction Created")
+        )
+    ]
+    return copy_rows(Reaction, ["post_id", "user_id", "created_at"], rows), []
 
 
-def create_comments():
+def create_reactions(post_ids, batch_size=WRITE_OPS_LIMIT, processes=1, stdout=None):
     user_ids = list(User.objects.all().values_list("id", flat=True))
-    post_ids = list(Post.objects.all().values_list("id", flat=True))
+    # A post gets up to 100 reactions, so keep each chunk near batch_size rows
+    chunks = [(chunk, user_ids) for chunk in chunked(post_ids, batch_size // 50 or 1)]
+    run_stage("Reactions", create_reaction_chunk, chunks, processes, stdout)
+
+
+def create_comment_chunk(args):
+    post_ids, user_ids = args
     weighted_numbers = get_random_weighted_numbers(
         lo=1, hi=50, w_r_lo=1, w_r_hi=5, frequency=100
     )
+    fields = ["post_id", "parent_id", "user_id", "description"]
+    fields += ["total_reply", "created_at", "updated_at"]
+    now = timezone.now()
 
-    comment_ops = []
-    total_comment = int(len(post_ids) * 0.5)  # 50% post will have comment
-    for post_id in random.sample(post_ids, total_comment):
+    comment_rows = []
+    for post_id in post_ids:
         for _ in range(random.choice(weighted_numbers)):
             """Post will have 1 to 50 comments where frequency of 1 to 5 will be 100 time high"""
-            comment_ops.append(
-                Comment(
-                    post_id=post_id,
-                    user_id=random.choice(user_ids),
-                    description=fake.sentence(
-                        nb_words=random.randint(10, 50), variable_nb_words=False
-                    ),
-                )
+            description = fake.sentence(
+                nb_words=random.randint(10, 50), variable_nb_words=False
+            )
+            comment_rows.append(
+                (post_id, None, random.choice(user_ids), description, 0, now, now)
             )
-    Comment.objects.bulk_create(comment_ops)
+    total = copy_rows(Comment, fields, comment_rows)
 
     # Create Replies
-    comment_ids = list(Comment.objects.all().values("id", "post_id"))
-    total_reply = int(len(comment_ids) * 0.3)  # 30% comment will have reply
+    comments = list(
+        Comment.objects.filter(post_id__in=post_ids, parent=None).values_list(
+            "id", "post_id"
+        )
+    )
+    total_reply = int(len(comments) * 0.3)  # 30% comment will have reply
 
-    reply_ops = []
-    for comment in random.sample(comment_ids, total_reply):
+    reply_rows = []
+    for comment_id, post_id in random.sample(comments, total_reply):
         for _ in range(random.choice(weighted_numbers)):
             """Comment will have 1 to 50 replies where frequency of 1 to 5 will be 100 time high"""
-            reply_ops.append(
-                Comment(
-                    parent_id=comment["id"],
-                    post_id=comment["post_id"],
-                    user_id=random.choice(user_ids),
-                    description=fake.sentence(
-                        nb_words=random.randint(5, 20), variable_nb_words=False
-                    ),
-                )
+            description = fake.sentence(
+                nb_words=random.randint(5, 20), variable_nb_words=False
             )
-    Comment.objects.bulk_create(reply_ops)
-    print("Comments Created")
+            reply_rows.append(
+                (post_id, comment_id, random.choice(user_ids), description, 0, now, now)
+            )
+    total += copy_rows(Comment, fields, reply_rows)
+    return total, []
 
 
-def update_relevant_fields():
-    from django.db import connection
+def create_comments(post_ids, batch_size=WRITE_OPS_LIMIT, processes=1, stdout=None):
+    user_ids = list(User.objects.all().values_list("id", flat=True))
+    total_comment = int(len(post_ids) * 0.5)  # 50% post will have comment
+    commented_post_ids = random.sample(post_ids, total_comment)
+    # A post gets around 10 comments and replies on average
+    chunks = [
+        (chunk, user_ids)
+        for chunk in chunked(commented_post_ids, batch_size // 10 or 1)
+    ]
+    run_stage("Comments", create_comment_chunk, chunks, processes, stdout)
 
-    update_total_comment_query = """
-        UPDATE post_post SET total_comment = COALESCE((
-            SELECT COUNT(*) FROM post_comment
-            WHERE post_comment.post_id = post_post.id
-            GROUP BY post_post.id
-        ), 0);
-    """
-    update_total_reaction_query = """
-        UPDATE post_post SET total_reaction = COALESCE((
-            SELECT COUNT(*) FROM post_reaction
-            WHERE post_reaction.post_id = post_post.id
-            GROUP BY post_post.id
-        ), 0);
-    """
 
-    with connection.cursor() as cursor:
-        cursor.execute(update_total_comment_query)
-        cursor.execute(update_total_reaction_query)
+def update_relevant_fields(post_ids, batch_size=WRITE_OPS_LIMIT):
+    rebuild_counts()
+    rebuild_reply_counts()
+    for chunk in chunked(post_ids, batch_size):
+        rebuild_scores(post_ids=chunk)
 
 
-def populate_database(total_user=10, total_post=10):
-    create_users(total_user)
-    create_posts(total_post)
+def populate_database(
+    total_user=10,
+    total_post=10,
+    batch_size=WRITE_OPS_LIMIT,
+    processes=1,
+    stdout=None,
+):
+    create_users(total_user, batch_size, stdout)
+    post_ids = create_posts(total_post, batch_size, processes, stdout)
 
-    create_reactions()
-    create_comments()
+    create_reactions(post_ids, batch_size, processes, stdout)
+    create_comments(post_ids, batch_size, processes, stdout)
 
-    update_relevant_fields()
+    update_relevant_fields(post_ids, batch_size)
+    invalidate_post()
 
 
 class Command(BaseCommand):
@@ -167,9 +290,17 @@ class Command(BaseCommand):
         # Positional arguments
         parser.add_argument("--total_user", type=int)
         parser.add_argument("--total_post", type=int)
+        parser.add_argument("--batch_size", type=int, default=WRITE_OPS_LIMIT)
+        parser.add_argument("--processes", type=int, default=PROCESSORS)
 
     def handle(self, *args, **options):
         total_user = options["total_user"]
         total_post = options["total_post"]
 
-        populate_database(total_user=total_user, total_post=total_post)
+        populate_database(
+            total_user=total_user,
+            total_post=total_post,
+            batch_size=options["batch_size"],
+            processes=options["processes"],
+            stdout=self.stdout,
+        )
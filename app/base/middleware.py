@@ -0,0 +1,148 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref import sync
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Normalize SQL so queries that only differ in values compare equal."""
+    sql = IN_LIST_RE.sub("(%s...)", sql)
+    return " ".join(LITERAL_RE.sub("?", sql).split())
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+
+def get_query_budget(view_func, method):
+    """
+    Read `query_budget` from the view class: either an int for every action
+    or a {action: int} dict, where the action of a ViewSet is its mapped
+    method name (list, retrieve, ...) and the HTTP method otherwise.
+    """
+    view_class = getattr(view_func, "cls", None)
+    budget = getattr(view_class, "query_budget", None)
+    if not isinstance(budget, dict):
+        return budget
+    actions = getattr(view_func, "actions", None) or {}
+    return budget.get(actions.get(method.lower(), method.lower()))
+
+
+class QueryMetricsMiddleware:
+    """
+    Record query count, DB time and repeated query shapes for every request.
+    The numbers are logged, added as X-DB-* headers when
+    QUERY_METRICS_HEADERS is on, and checked against the view's
+    `query_budget`; QUERY_BUDGET_STRICT turns an overrun into an exception.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if sync.iscoroutinefunction(self.get_response):
+            sync.markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if sync.iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        with self.record(recorder):
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        # Installing the wrappers costs two thread hops per request under
+        # ASGI, so only pay them when the numbers are actually checked
+        if not (
+            getattr(settings, "QUERY_METRICS_HEADERS", False)
+            or getattr(settings, "QUERY_BUDGET_STRICT", False)
+        ):
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        # The async ORM runs queries in the request's thread-sensitive
+        # executor, so the wrappers go on that thread's connections
+        stack = await sync.sync_to_async(self.record)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync.sync_to_async(stack.close)()
+        return self.report(request, response, recorder)
+
+    def record(self, recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def report(self, request, response, recorder):
+        match = getattr(request, "resolver_match", None)
+        budget = match and get_query_budget(match.func, request.method)
+        duplicates = recorder.duplicates
+        threshold = getattr(settings, "QUERY_DUPLICATE_THRESHOLD", 3)
+        repeated = {sql: n for sql, n in duplicates.items() if n >= threshold}
+
+        if getattr(settings, "QUERY_METRICS_HEADERS", False):
+            response["X-DB-Query-Count"] = str(recorder.count)
+            response["X-DB-Time-Ms"] = f"{recorder.duration * 1000:.2f}"
+            response["X-DB-Duplicate-Queries"] = str(sum(duplicates.values()))
+            if budget is not None:
+                response["X-DB-Query-Budget"] = str(budget)
+
+        logger.debug(
+            "%s %s: %d queries in %.2fms",
+            request.method,
+            request.path,
+            recorder.count,
+            recorder.duration * 1000,
+        )
+        for sql, count in repeated.items():
+            logger.warning(
+                "Possible N+1 on %s %s: %d x %s",
+                request.method,
+                request.path,
+                count,
+                sql,
+            )
+        if budget is not None and recorder.count > budget:
+            message = (
+                f"{request.method} {request.path} ran {recorder.count} queries, "
+                f"budget is {budget}"
+            )
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -1,5 +1,259 @@
-from rest_framework.pagination import LimitOffsetPagination
+import json
+from collections import OrderedDict
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class DefaultPagination(LimitOffsetPagination):
     default_limit = 20
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate for the queryset on PostgreSQL.
+    Falls back to an exact count on other database backends.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a fixed ordering.
+
+    Pages are fetched with `WHERE (keys) < (cursor keys)` instead of OFFSET, so
+    the cost of a page does not grow with its depth. The cursor is a signed,
+    opaque token holding the keys of the boundary row. Every ordering field
+    must be non-null and the last one must be unique (normally `id`); the
+    leading ones may be annotations such as a search rank.
+
+    Views can override the ordering with a `keyset_ordering` attribute or a
+    `get_keyset_ordering()` method.
+    """
+
+    ordering = ("-id",)
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    total_query_param = "with_total"
+    cursor_salt = "base.paginations.KeysetPagination"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.get_page_queryset(queryset, request, view)
+        if self.wants_count(request):
+            self.count = estimate_count(queryset)
+        return self.set_page(list(page[: self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Same as `paginate_queryset`, fetching the page with the async ORM."""
+        page = self.get_page_queryset(queryset, request, view)
+        if self.wants_count(request):
+            self.count = await sync_to_async(estimate_count)(queryset)
+        return self.set_page([obj async for obj in page[: self.page_size + 1]])
+
+    def wants_count(self, request):
+        return request.query_params.get(self.total_query_param) in ("1", "true")
+
+    def prepare(self, request, model, view=None):
+        """Read the page size, ordering and cursor of `request`."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(view)
+        self.fields = [
+            (name.lstrip("-"), name.startswith("-")) for name in self.ordering
+        ]
+        self.count = None
+        self.keys, self.reverse = self.decode_cursor(request, model)
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Return `queryset` ordered and filtered past the cursor, unsliced."""
+        self.prepare(request, queryset.model, view)
+        return self.seek(queryset)
+
+    def seek(self, queryset, names=None):
+        """
+        Order `queryset` and filter it past the cursor. `names` replaces the
+        ordering field names, for querysets of another model keyed the same.
+        """
+        queryset = queryset.order_by(*self.get_order_by(self.reverse, names))
+        if self.keys is not None:
+            queryset = queryset.filter(
+                self.get_seek_filter(self.keys, self.reverse, names)
+            )
+        return queryset
+
+    def set_page(self, results):
+        """Trim the `page_size + 1` fetched rows and work out the links."""
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = self.keys is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.keys is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        content = [
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]
+        if self.count is not None:
+            content.insert(0, ("count", self.count))
+        return Response(OrderedDict(content))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "example": 123},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, view):
+        if hasattr(view, "get_keyset_ordering"):
+            return tuple(view.get_keyset_ordering())
+        return tuple(getattr(view, "keyset_ordering", self.ordering))
+
+    def get_fields(self, names=None):
+        if names is None:
+            return self.fields
+        return [(name, desc) for name, (_, desc) in zip(names, self.fields)]
+
+    def get_order_by(self, reverse, names=None):
+        return [
+            f"-{name}" if desc != reverse else name
+            for name, desc in self.get_fields(names)
+        ]
+
+    def get_seek_filter(self, keys, reverse, names=None):
+        """
+        Build `(a, b) < (x, y)` as `a < x OR (a = x AND b < y)` so it works
+        with mixed sort directions.
+        """
+        fields = self.get_fields(names)
+        seek = Q()
+        for index, (name, desc) in enumerate(fields):
+            lookup = "lt" if desc != reverse else "gt"
+            condition = Q(
+                **{prev: keys[i] for i, (prev, _) in enumerate(fields[:index])}
+            )
+            condition &= Q(**{f"{name}__{lookup}": keys[index]})
+            seek |= condition
+        return seek
+
+    def encode_cursor(self, instance, reverse):
+        keys = [self.get_key(instance, name) for name, _ in self.fields]
+        payload = {"o": list(self.ordering), "k": keys, "r": int(reverse)}
+        token = signing.dumps(payload, salt=self.cursor_salt, compress=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = signing.loads(token, salt=self.cursor_salt)
+            if payload["o"] != list(self.ordering):
+                raise ValueError
+            keys = [
+                self.parse_key(model, name, value)
+                for (name, _), value in zip(self.fields, payload["k"], strict=True)
+            ]
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return keys, bool(payload.get("r"))
+
+    def get_key(self, instance, name):
+        try:
+            return instance._meta.get_field(name).value_to_string(instance)
+        except FieldDoesNotExist:
+            # Annotation, e.g. a search rank
+            return getattr(instance, name)
+
+    def parse_key(self, model, name, value):
+        try:
+            return model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+class FeedKeysetPagination(KeysetPagination):
+    ordering = ("-publish_at", "-id")
+
+
+class MergedKeysetPagination(FeedKeysetPagination):
+    """
+    Keyset pagination over the union of several sources. A source is a
+    queryset whose rows hold the ordering keys of an object under their own
+    field names, e.g. (TimelineEntry queryset, "publish_at", "post_id") for
+    posts ordered by ("-publish_at", "-id"). Each source is read with its own
+    index, the rows are merged in Python, and the page is then fetched from
+    `queryset` by id.
+    """
+
+    def paginate_sources(self, sources, queryset, request, view=None):
+        self.prepare(request, queryset.model, view)
+        limit = self.page_size + 1
+
+        rows = {}
+        for source, *names in sources:
+            for keys in self.seek(source, names).values_list(*names)[:limit]:
+                rows[keys[-1]] = keys
+        rows = list(rows.values())
+        for index in reversed(range(len(self.fields))):
+            desc = self.fields[index][1]
+            rows.sort(key=itemgetter(index), reverse=desc != self.reverse)
+
+        ids = [keys[-1] for keys in rows[:limit]]
+        objects = queryset.in_bulk(ids)
+        return self.set_page([objects[pk] for pk in ids if pk in objects])
@@ -0,0 +1,25 @@
+from django.urls import URLPattern
+from rest_framework.routers import DefaultRouter
+
+from .async_views import AsyncReadMixin, async_read_view
+
+
+class AsyncReadRouter(DefaultRouter):
+    """
+    DefaultRouter whose routes for `AsyncReadMixin` viewsets are async views,
+    so their read actions run natively under ASGI.
+    """
+
+    def get_urls(self):
+        urls = []
+        for url in super().get_urls():
+            view_class = getattr(url.callback, "cls", None)
+            if isinstance(view_class, type) and issubclass(view_class, AsyncReadMixin):
+                url = URLPattern(
+                    url.pattern,
+                    async_read_view(url.callback),
+                    url.default_args,
+                    url.name,
+                )
+            urls.append(url)
+        return urls
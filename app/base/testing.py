@@ -0,0 +1,24 @@
+from django.test import TestCase, override_settings
+
+
+@override_settings(QUERY_BUDGET_STRICT=True, QUERY_METRICS_HEADERS=True)
+class QueryBudgetTestCase(TestCase):
+    """
+    TestCase where any request exceeding its view's `query_budget` raises
+    base.middleware.QueryBudgetExceeded, failing the test.
+    """
+
+    def assertQueryCount(self, response, max_queries):
+        self.assertLessEqual(int(response["X-DB-Query-Count"]), max_queries)
+
+    def assertNoDuplicateQueries(self, response):
+        self.assertEqual(response["X-DB-Duplicate-Queries"], "0")
+
+    def login(self, client, username, password):
+        """Authenticate `client` with an access token from the token endpoint."""
+        response = client.post(
+            "/api/v1/token/", {"username": username, "password": password}
+        )
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        return response.json()
@@ -1 +1,127 @@
-# Create your tests here.
+import io
+import time
+from contextlib import redirect_stdout
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase
+from post.models import Comment, Post, Reaction
+
+from . import utils
+from .db import pool
+from .management.commands import benchmark, populatedb
+
+User = get_user_model()
+
+
+class SlugTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(  # type: ignore
+            username="demousername", password="demopassword"
+        )
+
+    def create_post(self, title="Test Post"):
+        return Post.objects.create(author=self.user, title=title, description="-")
+
+    def test_create_slug(self):
+        self.assertEqual(utils.create_slug(Post, "Test Post"), "test-post")
+        self.create_post()
+        slug = utils.create_slug(Post, "Test Post")
+        self.assertTrue(slug.startswith("test-post-"))
+        self.assertEqual(len(slug), len("test-post-") + utils.SLUG_SUFFIX_LENGTH)
+
+        long_slug = utils.create_slug(Post, "a" * 300)
+        self.assertLessEqual(len(long_slug), Post._meta.get_field("slug").max_length)
+
+    def test_allocate_slugs(self):
+        self.create_post()
+        slugs = utils.allocate_slugs(Post, ["Test Post", "Other", "Other"])
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertNotIn("test-post", slugs)
+        self.assertIn("other", slugs)
+
+    def test_save_with_slug_retries_on_collision(self):
+        taken = self.create_post()
+        with mock.patch.object(utils, "create_slug", return_value=taken.slug):
+            post = self.create_post()
+        self.assertNotEqual(post.slug, taken.slug)
+        self.assertTrue(post.slug.startswith("test-post-"))
+
+
+class FakeConnection:
+    closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def test_reuse_and_bound(self):
+        connection_pool = pool.ConnectionPool(FakeConnection, max_size=2, timeout=0.01)
+        first = connection_pool.acquire(lambda connection: True)
+        second = connection_pool.acquire(lambda connection: True)
+        with self.assertRaises(pool.PoolTimeout):
+            connection_pool.acquire(lambda connection: True)
+
+        connection_pool.release(first)
+        self.assertIs(connection_pool.acquire(lambda connection: True), first)
+        connection_pool.release(second, reusable=False)
+        self.assertTrue(second.closed)
+
+        stats = connection_pool.stats()
+        self.assertEqual(stats["opened"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["in_use"], 1)
+        self.assertEqual(stats["saturation"], 0.5)
+
+    def test_health_check_and_max_age(self):
+        connection_pool = pool.ConnectionPool(
+            FakeConnection, max_size=1, max_age=60, check_idle=0
+        )
+        broken = connection_pool.acquire(lambda connection: True)
+        connection_pool.release(broken)
+        fresh = connection_pool.acquire(lambda connection: connection is not broken)
+        self.assertIsNot(fresh, broken)
+        self.assertTrue(broken.closed)
+
+        connection_pool.release(fresh)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNot(connection_pool.acquire(lambda connection: True), fresh)
+        self.assertEqual(connection_pool.stats()["discarded"], 2)
+
+
+class PopulateDBTestCase(TestCase):
+    def test_populate_database(self):
+        with redirect_stdout(io.StringIO()) as output:
+            populatedb.populate_database(
+                total_user=5, total_post=12, batch_size=5, processes=1
+            )
+        self.assertIn("Posts: ", output.getvalue())
+
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Post.objects.count(), 12)
+        self.assertTrue(Reaction.objects.exists())
+        self.assertTrue(Comment.objects.exists())
+
+        posts = Post.objects.annotate(
+            comments_count=Count("comments", distinct=True),
+            reactions_count=Count("reactions", distinct=True),
+            topics_count=Count("topic_items", distinct=True),
+        )
+        for post in posts:
+            self.assertEqual(post.total_comment, post.comments_count)
+            self.assertEqual(post.total_reaction, post.reactions_count)
+            self.assertGreater(post.topics_count, 0)
+
+
+class BenchmarkTestCase(TestCase):
+    def test_benchmark_run(self):
+        with redirect_stdout(io.StringIO()):
+            populatedb.populate_database(total_user=3, total_post=5, processes=1)
+
+        result = benchmark.Benchmark(seed=1).run(total_requests=40, warmup=5)
+        self.assertEqual(result["requests"], 40)
+        for name, stats in result["scenarios"].items():
+            self.assertEqual(stats["errors"], 0, name)
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
@@ -1,19 +1,73 @@
 from random import choice
 from string import ascii_uppercase, digits
 
+from django.db import IntegrityError, transaction
 from django.utils.text import slugify
 
+SLUG_SUFFIX_LENGTH = 6
+
 
 def rand_str(N=12):
     return "".join(choice(ascii_uppercase + digits) for _ in range(N))
 
 
-def create_slug(model, source_data="None", dest_field="slug", filter_kwargs={}):
-    slug = slugify(source_data, allow_unicode=True)
-    count = model.objects.filter(
-        **{f"{dest_field}__startswith": slug}, **filter_kwargs
-    ).count()
-    if count > 0:
-        return f"{slug}-{count}-{rand_str(6)}"
-    else:
-        return slug
+def _base_slug(model, source_data, dest_field):
+    max_length = model._meta.get_field(dest_field).max_length or 50
+    slug = slugify(source_data, allow_unicode=True) or rand_str(SLUG_SUFFIX_LENGTH)
+    return slug[: max_length - SLUG_SUFFIX_LENGTH - 1].strip("-")
+
+
+def _suffixed(slug):
+    return f"{slug}-{rand_str(SLUG_SUFFIX_LENGTH)}"
+
+
+def create_slug(model, source_data="None", dest_field="slug", filter_kwargs=None):
+    """
+    Return an unused slug for `source_data` with a single probe of the slug
+    index; a random suffix is added when the plain slug is taken.
+    """
+    slug = _base_slug(model, source_data, dest_field)
+    taken = model.objects.filter(**{dest_field: slug}, **(filter_kwargs or {}))
+    return _suffixed(slug) if taken.exists() else slug
+
+
+def allocate_slugs(model, sources, dest_field="slug", filter_kwargs=None):
+    """Return one unused slug per item of `sources` with a single query."""
+    slugs = [_base_slug(model, source, dest_field) for source in sources]
+    taken = set(
+        model.objects.filter(
+            **{f"{dest_field}__in": set(slugs)}, **(filter_kwargs or {})
+        ).values_list(dest_field, flat=True)
+    )
+
+    allocated = []
+    for slug in slugs:
+        if slug in taken:
+            slug = _suffixed(slug)
+        taken.add(slug)
+        allocated.append(slug)
+    return allocated
+
+
+def save_with_slug(
+    instance, save, source_data, dest_field="slug", filter_kwargs=None, retries=3
+):
+    """
+    Allocate a slug for a new `instance` and call `save()`, retrying with a
+    fresh suffix when a concurrent insert took the same slug first.
+    """
+    model = type(instance)
+    base_slug = _base_slug(model, source_data, dest_field)
+    setattr(
+        instance, dest_field, create_slug(model, source_data, dest_field, filter_kwargs)
+    )
+    for attempt in range(retries):
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            slug = getattr(instance, dest_field)
+            collided = model.objects.filter(**{dest_field: slug}).exists()
+            if not collided or attempt == retries - 1:
+                raise
+            setattr(instance, dest_field, _suffixed(base_slug))
@@ -27,12 +27,14 @@ DEFAULT_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 LOCAL_APPS = [
     "base",
     "post",
     "user",
+    "feed",
 ]
 
 THIRDPARTY_APPS = [
@@ -49,6 +51,7 @@ SITE_ID = 1
 APPEND_SLASH = False
 
 MIDDLEWARE = [
+    "base.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -84,14 +87,28 @@ AUTH_USER_MODEL = "user.User"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections come from a per-process pool bounded by DB_POOL_SIZE, by
+# default one per gunicorn thread. CONN_MAX_AGE is the lifetime of a pooled
+# connection, and connections idle for CHECK_IDLE seconds are health checked
+# before reuse. DB_POOL_SIZE=0 falls back to one connection per thread.
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "base.db.postgresql",
         "NAME": os.environ.get("POSTGRES_DB"),
         "USER": os.environ.get("POSTGRES_USER"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": "db",
         "PORT": 5432,
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+        "POOL": {
+            "MAX_SIZE": int(
+                os.environ.get("DB_POOL_SIZE", os.environ.get("GUNICORN_THREADS", "5"))
+            ),
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            "CHECK_IDLE": 30,
+        },
     }
 }
 
@@ -145,11 +162,89 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "auth": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auth",
+    },
+}
+if os.environ.get("RESPONSE_CACHE_URL"):
+    # Shared between workers, e.g. redis://cache:6379/1; required by the
+    # publish_posts command, which runs in a process of its own
+    CACHES["responses"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["RESPONSE_CACHE_URL"],
+    }
+    CACHES["auth"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["RESPONSE_CACHE_URL"],
+        "KEY_PREFIX": "auth",
+    }
+RESPONSE_CACHE_ALIAS = "responses"
+# Token revocations of the stateless JWT authentication (see
+# user.authentication). With a cache local to each process, as without
+# RESPONSE_CACHE_URL, every request checks the user row instead.
+AUTH_CACHE_ALIAS = "auth"
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", "60"))
+
+# Query metrics: X-DB-* headers per response, repeated query shapes logged as
+# possible N+1, and views exceeding their `query_budget` raise when strict.
+QUERY_METRICS_HEADERS = DEBUG
+QUERY_BUDGET_STRICT = False
+QUERY_DUPLICATE_THRESHOLD = 3
+
+# Post counters: "direct" updates total_comment/total_reaction in the writing
+# transaction, "buffered" batches the deltas per process and flushes them every
+# POST_COUNTER_FLUSH_INTERVAL seconds.
+POST_COUNTER_MODE = os.environ.get("POST_COUNTER_MODE", "direct")
+POST_COUNTER_FLUSH_INTERVAL = float(os.environ.get("POST_COUNTER_FLUSH_INTERVAL", "1"))
+# Hours after which a reaction or comment counts half as much for trending
+POST_TRENDING_HALF_LIFE = float(os.environ.get("POST_TRENDING_HALF_LIFE", "24"))
+
+# Home feed: posts are fanned out to the timelines of their author's
+# followers, each capped at FEED_TIMELINE_LENGTH entries. Authors with
+# FEED_FANOUT_THRESHOLD followers or more are merged into feeds on read.
+FEED_FANOUT_THRESHOLD = int(os.environ.get("FEED_FANOUT_THRESHOLD", "1000"))
+FEED_TIMELINE_LENGTH = int(os.environ.get("FEED_TIMELINE_LENGTH", "500"))
+# Where posts are fanned out once published (see feed.timeline): "pool" in
+# FEED_FANOUT_WORKERS threads per process, "inline" after the commit
+FEED_FANOUT_MODE = os.environ.get("FEED_FANOUT_MODE", "pool")
+FEED_FANOUT_WORKERS = int(os.environ.get("FEED_FANOUT_WORKERS", "2"))
+
+# Replies shown under each top level comment, the rest are paginated from
+# /posts/<slug>/comments/<id>/replies/
+COMMENT_REPLY_PREVIEW = int(os.environ.get("COMMENT_REPLY_PREVIEW", "3"))
+
+# Cover image variants (see post.images): "pool" renders them in
+# POST_IMAGE_WORKERS threads per process, "inline" in the request after commit
+POST_IMAGE_MODE = os.environ.get("POST_IMAGE_MODE", "pool")
+POST_IMAGE_WORKERS = int(os.environ.get("POST_IMAGE_WORKERS", "2"))
+
+# Cover uploads (see post.uploads) are rejected past POST_COVER_MAX_SIZE bytes
+# or POST_COVER_MAX_DIMENSION pixels on a side, as soon as they get there
+POST_COVER_MAX_SIZE = int(os.environ.get("POST_COVER_MAX_SIZE", str(10 * 1024 * 1024)))
+POST_COVER_MAX_DIMENSION = int(os.environ.get("POST_COVER_MAX_DIMENSION", "8000"))
+
+# Author profiles embedded in post and comment lists, kept per process
+USER_PROFILE_CACHE_SIZE = int(os.environ.get("USER_PROFILE_CACHE_SIZE", "10000"))
+USER_PROFILE_CACHE_TIMEOUT = int(os.environ.get("USER_PROFILE_CACHE_TIMEOUT", "300"))
+
 # Thirdparty Keys
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.StatelessJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     )
 }
@@ -160,4 +255,6 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.TokenRefreshSerializer",
 }
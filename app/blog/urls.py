@@ -17,20 +17,21 @@ Including another URLconf
 import logging
 
 from base import views as base_views
+from base.routers import AsyncReadRouter
 from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import (SpectacularAPIView, SpectacularRedocView,
                                    SpectacularSwaggerView)
+from feed import views as feed_views
 from post import views as post_views
-from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView)
 from user import views as user_views
 
 logger = logging.getLogger(__name__)
 
-router = DefaultRouter()
+router = AsyncReadRouter()
 
 router.register(r"users", user_views.UserListViewSet, basename="users")
 router.register(r"posts", post_views.PostViewSet, basename="post")
@@ -40,6 +41,19 @@ router.register(
 router.register(
     r"posts/(?P<slug>[^/.]+)/reactions", post_views.ReactionViewSet, basename="post"
 )
+router.register(r"reactions", post_views.ReactionBatchViewSet, basename="reactions")
+router.register(r"topics", post_views.TopicViewSet, basename="topics")
+router.register(r"feed", feed_views.FeedViewSet, basename="feed")
+router.register(
+    r"users/(?P<username>[^/.]+)/follow",
+    feed_views.UserFollowViewSet,
+    basename="user-follow",
+)
+router.register(
+    r"topics/(?P<slug>[^/.]+)/follow",
+    feed_views.TopicFollowViewSet,
+    basename="topic-follow",
+)
 
 urlpatterns = [
     path("", base_views.BaseViewSet.as_view({"get": "home"}), name="Home"),
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from post.models import Post
+from post.signals import post_published
+from taggit.models import Tag
+
+from . import timeline
+
+User = get_user_model()
+
+
+class UserFollow(models.Model):
+    follower = models.ForeignKey(
+        User, related_name="following", on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(User, related_name="followers", on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "author"], name="user_follow_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.follower_id} -> {self.author_id}"
+
+
+class TopicFollow(models.Model):
+    follower = models.ForeignKey(
+        User, related_name="followed_topics", on_delete=models.CASCADE
+    )
+    topic = models.ForeignKey(Tag, related_name="followers", on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "topic"], name="topic_follow_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.follower_id} -> {self.topic_id}"
+
+
+class TimelineEntry(models.Model):
+    """A post fanned out to one follower of its author."""
+
+    user = models.ForeignKey(
+        User, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post, related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    # Copied from the post so a timeline page is one index range scan
+    publish_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="timeline_entry_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-publish_at", "-post"], name="timeline_user_idx"
+            ),
+        ]
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    # New posts are fanned out when published, edits keep the entries in sync
+    if not created:
+        timeline.schedule(instance.pk)
+
+
+@receiver(post_published, sender=Post)
+def fan_out_published_post(sender, instance, **kwargs):
+    timeline.schedule(instance.pk)
@@ -0,0 +1,131 @@
+from datetime import timedelta
+from typing import Any
+
+from base.testing import QueryBudgetTestCase
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from post import publishing
+from post.models import Post
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from . import models
+
+User = get_user_model()
+
+
+@override_settings(FEED_FANOUT_MODE="inline")
+class FeedTestCase(QueryBudgetTestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(  # type: ignore
+            username="reader", password="demopassword"
+        )
+        self.author = User.objects.create_user(  # type: ignore
+            username="author", password="demopassword"
+        )
+        self.client: Any = APIClient()
+        self.client.force_authenticate(user=self.reader)
+
+    def create_post(self, title="Test Post", author=None, publish_at=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post(
+                author=author or self.author,
+                title=title,
+                description="-",
+                publish_at=publish_at or timezone.now() - timedelta(minutes=1),
+            )
+            post.save()
+        return post
+
+    def follow(self, username):
+        with self.captureOnCommitCallbacks(execute=True):
+            url = reverse("user-follow-list", kwargs={"username": username})
+            return self.client.post(url)
+
+    def get_feed_slugs(self, url="/api/v1/feed/"):
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["slug"] for post in response.json()["results"]], response.json()
+
+    def test_follow_yourself_with_token(self):
+        client = APIClient()
+        self.login(client, "reader", "demopassword")
+        response = client.post("/api/v1/users/reader/follow/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(models.UserFollow.objects.exists())
+
+    def test_fan_out_on_write(self):
+        old_post = self.create_post("Old")
+        response = self.follow(self.author.username)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.follow(self.author.username).status_code, 400)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.total_follower, 1)
+
+        new_post = self.create_post("New")
+        self.assertEqual(
+            models.TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        slugs, _ = self.get_feed_slugs()
+        self.assertEqual(slugs, [new_post.slug, old_post.slug])
+
+        response = self.client.delete(
+            f"/api/v1/users/{self.author.username}/follow/remove/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.get_feed_slugs()[0], [])
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.total_follower, 0)
+
+    def test_fan_out_scheduled_post(self):
+        self.follow(self.author.username)
+        publish_at = timezone.now() + timedelta(days=1)
+        scheduled = self.create_post("Scheduled", publish_at=publish_at)
+        self.assertFalse(models.TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed_slugs()[0], [])
+
+        # Fanned out by the publishing worker
+        with self.captureOnCommitCallbacks(execute=True):
+            publishing.publish_due_posts(now=publish_at)
+        self.assertEqual(self.get_feed_slugs()[0], [scheduled.slug])
+
+        # Rescheduled posts leave the timelines until published again
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduled.publish_at = timezone.now() + timedelta(days=2)
+            scheduled.save()
+        self.assertFalse(models.TimelineEntry.objects.exists())
+        self.assertEqual(self.get_feed_slugs()[0], [])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_timeline_is_bounded(self):
+        self.follow(self.author.username)
+        posts = [self.create_post(f"Post {index}") for index in range(4)]
+        entries = models.TimelineEntry.objects.filter(user=self.reader)
+        self.assertEqual(
+            set(entries.values_list("post_id", flat=True)), {posts[2].id, posts[3].id}
+        )
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_merge_on_read(self):
+        self.follow(self.author.username)
+        author_posts = [self.create_post(f"Author {index}") for index in range(3)]
+        self.assertFalse(models.TimelineEntry.objects.exists())
+
+        other = User.objects.create_user(  # type: ignore
+            username="other", password="demopassword"
+        )
+        topic_post = self.create_post("Topic", author=other)
+        topic_post.topics.add("django")
+        url = reverse("topic-follow-list", kwargs={"slug": "django"})
+        self.assertEqual(url, "/api/v1/topics/django/follow/")
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Tagged with the followed topic and written by a followed author
+        author_posts[0].topics.add("django")
+
+        slugs, page = self.get_feed_slugs("/api/v1/feed/?limit=2")
+        self.assertEqual(slugs, [topic_post.slug, author_posts[2].slug])
+        next_slugs, _ = self.get_feed_slugs(page["next"])
+        self.assertEqual(next_slugs, [author_posts[1].slug, author_posts[0].slug])
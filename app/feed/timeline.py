@@ -0,0 +1,227 @@
+"""
+Per-user home timelines.
+
+Publishing a post copies it into the timeline of every follower of its author
+(fan-out on write), keeping each timeline to the newest FEED_TIMELINE_LENGTH
+entries. Authors with FEED_FANOUT_THRESHOLD followers or more are skipped,
+and so are topics: their posts are merged into the feed when it is read
+(fan-out on read), so one post never writes more than threshold rows.
+
+Posts are fanned out once published (`post_published`), so scheduled posts
+by the publishing worker when their time comes, and taken out of timelines
+when unpublished. Timelines only show published posts. Entries keep the post's
+publish_at so a timeline page is one index range scan.
+
+FEED_FANOUT_MODE picks where the fan-out runs: "pool" (default) in a thread
+pool of FEED_FANOUT_WORKERS per process, off the request that published the
+post, "inline" once its transaction commits.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.functions import Greatest, RowNumber
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def get_fanout_threshold():
+    return getattr(settings, "FEED_FANOUT_THRESHOLD", 1000)
+
+
+def get_timeline_length():
+    return getattr(settings, "FEED_TIMELINE_LENGTH", 500)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def is_fanned_out(author_id):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    total_follower = (
+        User.objects.filter(pk=author_id)
+        .values_list("total_follower", flat=True)
+        .first()
+    )
+    return (total_follower or 0) < get_fanout_threshold()
+
+
+def add_entries(user_ids, posts):
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    for chunk in chunked(user_ids, FANOUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id, post_id=post.pk, publish_at=post.publish_at
+                )
+                for user_id in chunk
+                for post in posts
+            ],
+            ignore_conflicts=True,
+        )
+        trim(chunk)
+
+
+def trim(user_ids):
+    """Drop the entries past the newest FEED_TIMELINE_LENGTH of each user."""
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    overflow = (
+        TimelineEntry.objects.filter(user_id__in=user_ids)
+        .annotate(
+            position=models.Window(
+                RowNumber(),
+                partition_by=[models.F("user_id")],
+                order_by=[models.F("publish_at").desc(), models.F("post_id").desc()],
+            )
+        )
+        .filter(position__gt=get_timeline_length())
+        .values_list("pk", flat=True)
+    )
+    TimelineEntry.objects.filter(pk__in=list(overflow)).delete()
+
+
+def fan_out(post_id):
+    """
+    Copy the post into its author's followers' timelines once published, or
+    keep its entries in sync with the current row.
+    """
+    Post = apps.get_model("post", "Post")
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    UserFollow = apps.get_model("feed", "UserFollow")
+
+    post = (
+        Post.objects.filter(pk=post_id)
+        .only("author_id", "publish_at", "is_published")
+        .first()
+    )
+    if post is None:
+        return
+    entries = TimelineEntry.objects.filter(post_id=post_id)
+    if not post.is_published:
+        entries.delete()
+        return
+    if entries.update(publish_at=post.publish_at):
+        # Already fanned out, new followers are backfilled on follow
+        return
+    if not is_fanned_out(post.author_id):
+        return
+
+    follower_ids = list(
+        UserFollow.objects.filter(author_id=post.author_id).values_list(
+            "follower_id", flat=True
+        )
+    )
+    add_entries(follower_ids, [post])
+
+
+def get_workers():
+    return getattr(settings, "FEED_FANOUT_WORKERS", 2)
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_workers(), thread_name_prefix="feed-fanout"
+        )
+    return _executor
+
+
+def run(post_id):
+    try:
+        fan_out(post_id)
+    except Exception:
+        logger.exception("Failed to fan out post %s", post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post_id):
+    """Fan the post out once the current transaction commits."""
+    if getattr(settings, "FEED_FANOUT_MODE", "pool") == "inline":
+        transaction.on_commit(lambda: fan_out(post_id))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run, post_id))
+
+
+def follow(follower, author):
+    """Update the follower count and backfill the author's recent posts."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model("post", "Post")
+    User.objects.filter(pk=author.pk).update(
+        total_follower=models.F("total_follower") + 1
+    )
+    if not is_fanned_out(author.pk):
+        return
+    posts = Post.objects.filter(author=author, is_published=True).order_by(
+        "-publish_at", "-id"
+    )[: get_timeline_length()]
+    add_entries([follower.pk], list(posts.only("pk", "publish_at")))
+
+
+def unfollow(follower, author):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    User.objects.filter(pk=author.pk).update(
+        total_follower=Greatest(models.F("total_follower") - 1, models.Value(0))
+    )
+    TimelineEntry.objects.filter(user=follower, post__author=author).delete()
+
+
+def get_sources(user):
+    """
+    Return the (queryset, publish_at field, post id field) sources of the
+    feed of `user`, each ordered like the feed once seeked by the paginator.
+    """
+    Post = apps.get_model("post", "Post")
+    TimelineEntry = apps.get_model("feed", "TimelineEntry")
+    UserFollow = apps.get_model("feed", "UserFollow")
+    TopicFollow = apps.get_model("feed", "TopicFollow")
+    PostTopic = apps.get_model("post", "PostTopic")
+
+    sources = [
+        (
+            TimelineEntry.objects.filter(user=user, post__is_published=True),
+            "publish_at",
+            "post_id",
+        )
+    ]
+
+    author_ids = list(
+        UserFollow.objects.filter(
+            follower=user, author__total_follower__gte=get_fanout_threshold()
+        ).values_list("author_id", flat=True)
+    )
+    if author_ids:
+        sources.append(
+            (
+                Post.objects.filter(author_id__in=author_ids, is_published=True),
+                "publish_at",
+                "id",
+            )
+        )
+
+    topic_ids = list(
+        TopicFollow.objects.filter(follower=user).values_list("topic_id", flat=True)
+    )
+    if topic_ids:
+        topic_post_ids = PostTopic.objects.filter(tag_id__in=topic_ids).values(
+            "content_object"
+        )
+        sources.append(
+            (
+                Post.objects.filter(is_published=True, id__in=topic_post_ids),
+                "publish_at",
+                "id",
+            )
+        )
+    return sources
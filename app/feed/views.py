@@ -0,0 +1,91 @@
+from base import paginations
+from base.columns import SerializerColumnsMixin
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
+from post.models import Post
+from post.serializers import PostListSerializer
+from rest_framework import mixins, permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from taggit.models import Tag
+
+from . import models, timeline
+
+User = get_user_model()
+
+
+class FeedViewSet(
+    SerializerColumnsMixin, mixins.ListModelMixin, viewsets.GenericViewSet
+):
+    queryset = Post.objects.none()
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PostListSerializer
+    pagination_class = paginations.MergedKeysetPagination
+    query_budget = {"list": 8}
+
+    def get_queryset(self):
+        return Post.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginator.paginate_sources(
+            timeline.get_sources(request.user),
+            self.select_columns(self.get_queryset()),
+            request,
+            self,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+
+class UserFollowViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    queryset = models.UserFollow.objects.none()
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        author = get_object_or_404(User, username=kwargs.get("username"))
+        if author.pk == request.user.pk:
+            raise ValidationError("You can't follow yourself")
+        try:
+            with transaction.atomic():
+                models.UserFollow.objects.create(follower=request.user, author=author)
+                timeline.follow(request.user, author)
+        except IntegrityError:
+            raise ValidationError("You already follow this user")
+        return Response(status=status.HTTP_201_CREATED, data={"message": "Followed"})
+
+    @action(detail=False, methods=["delete"])
+    def remove(self, request, *args, **kwargs):
+        author = get_object_or_404(User, username=kwargs.get("username"))
+        with transaction.atomic():
+            deleted, _ = models.UserFollow.objects.filter(
+                follower=request.user, author=author
+            ).delete()
+            if deleted:
+                timeline.unfollow(request.user, author)
+        return Response(
+            status=status.HTTP_204_NO_CONTENT, data={"message": "Unfollowed"}
+        )
+
+
+class TopicFollowViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    queryset = models.TopicFollow.objects.none()
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        topic = get_object_or_404(Tag, slug=kwargs.get("slug"))
+        try:
+            with transaction.atomic():
+                models.TopicFollow.objects.create(follower=request.user, topic=topic)
+        except IntegrityError:
+            raise ValidationError("You already follow this topic")
+        return Response(status=status.HTTP_201_CREATED, data={"message": "Followed"})
+
+    @action(detail=False, methods=["delete"])
+    def remove(self, request, *args, **kwargs):
+        topic = get_object_or_404(Tag, slug=kwargs.get("slug"))
+        models.TopicFollow.objects.filter(follower=request.user, topic=topic).delete()
+        return Response(
+            status=status.HTTP_204_NO_CONTENT, data={"message": "Unfollowed"}
+        )
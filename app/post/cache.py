@@ -0,0 +1,25 @@
+from base.cache import ResponseCache
+from django.db import transaction
+
+post_cache = ResponseCache("post")
+# Topic popularity only expires, posts don't invalidate it
+topic_cache = ResponseCache("topic")
+
+
+def invalidate_post(slug=None):
+    """
+    Drop every cached post list page, plus the detail page of `slug`, once
+    the current transaction commits so readers can't re-cache old rows.
+    """
+    invalidate_posts([slug] if slug else [])
+
+
+def invalidate_posts(slugs):
+    """`invalidate_post` for several posts, the lists being dropped once."""
+    slugs = list(slugs)
+
+    def invalidate():
+        post_cache.invalidate("list")
+        post_cache.invalidate_many("retrieve", slugs)
+
+    transaction.on_commit(invalidate)
@@ -0,0 +1,323 @@
+"""
+Denormalized counters on Post (total_comment, total_reaction).
+
+Counters are maintained with `UPDATE ... SET col = col + delta` so writers only
+touch the counter column and never recount. Two modes, picked by the
+POST_COUNTER_MODE setting:
+
+- "direct": the delta is applied in the same transaction as the insert/delete.
+- "buffered": deltas are summed in process memory after commit and flushed in
+  batches every POST_COUNTER_FLUSH_INTERVAL seconds, so a burst of likes on one
+  post becomes a single UPDATE.
+
+The same UPDATE moves the ranking scores of post.ranking: `top_score` with
+the counter and `trending_score` with the time of the activity. It also sets
+`updated_at`, the version of the row for conditional requests.
+
+Comment.total_reply and Comment.last_reply_at are kept the same way on the
+parent comment, always directly: they are written with the reply itself.
+Editing a reply moves the parent's `updated_at` too, since comments are
+rendered with their first replies.
+
+`incr_many` applies the changes of a batch (e.g. the reactions of one request)
+in a single UPDATE, a CASE on the post id per column, as does a flush of the
+buffered mode.
+
+`rebuild_counts` and `rebuild_reply_counts` recompute the counters from the
+source tables.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.expressions import Case, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import ranking
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FIELDS = ("total_comment", "total_reaction")
+
+
+def counter_update(field, delta):
+    """update() kwargs moving `field` and `top_score` by `delta`."""
+    return counters_update({field: delta})
+
+
+def counters_update(deltas):
+    """update() kwargs moving the counters of {field: delta} and `top_score`."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    top_delta = sum(
+        ranking.ACTIVITY_WEIGHTS[field] * delta for field, delta in deltas.items()
+    )
+    return {
+        **{
+            field: Greatest(F(field) + delta, Value(0))
+            for field, delta in deltas.items()
+        },
+        "top_score": Greatest(F("top_score") + top_delta, Value(0)),
+        "updated_at": timezone.now(),
+    }
+
+
+def update_posts(updates):
+    """Apply {post_id: update() kwargs} in one UPDATE, a CASE per column."""
+    Post = apps.get_model("post", "Post")
+
+    updates = {post_id: kwargs for post_id, kwargs in updates.items() if kwargs}
+    if not updates:
+        return
+    fields = sorted({field for kwargs in updates.values() for field in kwargs})
+    Post.objects.filter(pk__in=sorted(updates)).update(
+        **{
+            field: Case(
+                *[
+                    When(pk=post_id, then=kwargs[field])
+                    for post_id, kwargs in sorted(updates.items())
+                    if field in kwargs
+                ],
+                default=F(field),
+                output_field=Post._meta.get_field(field),
+            )
+            for field in fields
+        }
+    )
+
+
+def apply_deltas(deltas, activity=None):
+    """
+    Apply {(post_id, field): delta} and {post_id: (added, removed)} log2 sums
+    of trending activity in one UPDATE.
+    """
+    activity = activity or {}
+    per_post = defaultdict(dict)
+    for (post_id, field), delta in deltas.items():
+        per_post[post_id][field] = delta
+
+    update_posts(
+        {
+            post_id: {
+                **counters_update(per_post.get(post_id, {})),
+                **ranking.trending_update(*activity.get(post_id, (None, None))),
+            }
+            for post_id in per_post.keys() | activity.keys()
+        }
+    )
+
+
+def activity_of(field, delta, at):
+    """Return the (added, removed) trending terms of one counter change."""
+    if at is None or not delta:
+        return None, None
+    term = ranking.activity_term(at, ranking.ACTIVITY_WEIGHTS[field])
+    return (term, None) if delta > 0 else (None, term)
+
+
+def merge_activity(terms, other):
+    """Sum two (added, removed) pairs of log2 sums, None being empty."""
+    return tuple(
+        b if a is None else a if b is None else ranking.log2_add(a, b)
+        for a, b in zip(terms or (None, None), other)
+    )
+
+
+def collect(changes):
+    """Sum [(post_id, field, delta, at)] into the arguments of apply_deltas."""
+    deltas = defaultdict(int)
+    activity = {}
+    for post_id, field, delta, at in changes:
+        deltas[(post_id, field)] += delta
+        activity[post_id] = merge_activity(
+            activity.get(post_id), activity_of(field, delta, at)
+        )
+    return deltas, activity
+
+
+class DirectCounter:
+    def add(self, post_id, field, delta, at=None):
+        Post = apps.get_model("post", "Post")
+        Post.objects.filter(pk=post_id).update(
+            **counter_update(field, delta),
+            **ranking.trending_update(*activity_of(field, delta, at)),
+        )
+
+    def add_many(self, changes):
+        apply_deltas(*collect(changes))
+
+    def flush(self):
+        pass
+
+
+class BufferedCounter:
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval
+        self.deltas = defaultdict(int)
+        self.activity = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, post_id, field, delta, at=None):
+        transaction.on_commit(lambda: self._buffer(post_id, field, delta, at))
+
+    def add_many(self, changes):
+        changes = list(changes)
+
+        def buffer():
+            for change in changes:
+                self._buffer(*change)
+
+        transaction.on_commit(buffer)
+
+    def _buffer(self, post_id, field, delta, at=None):
+        with self.lock:
+            self.deltas[(post_id, field)] += delta
+            self.activity[post_id] = merge_activity(
+                self.activity.get(post_id), activity_of(field, delta, at)
+            )
+            if self.flush_interval and self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def flush(self):
+        with self.lock:
+            pending, self.deltas = self.deltas, defaultdict(int)
+            activity, self.activity = self.activity, {}
+        if not pending and not activity:
+            return
+        try:
+            with transaction.atomic():
+                apply_deltas(pending, activity)
+        except Exception:
+            with self.lock:
+                for key, delta in pending.items():
+                    self.deltas[key] += delta
+                for post_id, terms in activity.items():
+                    self.activity[post_id] = merge_activity(
+                        self.activity.get(post_id), terms
+                    )
+            raise
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush post counters")
+            finally:
+                connection.close()
+
+
+_counter = None
+
+
+def get_counter():
+    global _counter
+    if _counter is None:
+        if getattr(settings, "POST_COUNTER_MODE", "direct") == "buffered":
+            _counter = BufferedCounter(
+                flush_interval=getattr(settings, "POST_COUNTER_FLUSH_INTERVAL", 1.0)
+            )
+        else:
+            _counter = DirectCounter()
+    return _counter
+
+
+def incr(post_id, field, delta=1, at=None):
+    """Move a counter of the post, `at` is the time of the activity for ranking."""
+    get_counter().add(post_id, field, delta, at)
+
+
+def incr_many(changes):
+    """`incr` for [(post_id, field, delta, at)], in a single UPDATE."""
+    get_counter().add_many(changes)
+
+
+def rebuild_counts(post_ids=None):
+    Post = apps.get_model("post", "Post")
+    Comment = apps.get_model("post", "Comment")
+    Reaction = apps.get_model("post", "Reaction")
+
+    def count_of(model):
+        rows = (
+            model.objects.filter(post=OuterRef("pk"))
+            .order_by()
+            .values("post")
+            .annotate(total=Count("*"))
+            .values("total")
+        )
+        return Coalesce(Subquery(rows), 0)
+
+    queryset = Post.objects.all()
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=post_ids)
+    return queryset.update(
+        total_comment=count_of(Comment), total_reaction=count_of(Reaction)
+    )
+
+
+def add_reply(parent_id, created_at):
+    Comment = apps.get_model("post", "Comment")
+    Comment.objects.filter(pk=parent_id).update(
+        total_reply=F("total_reply") + 1,
+        last_reply_at=Greatest(
+            Coalesce(F("last_reply_at"), Value(created_at)), Value(created_at)
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def remove_reply(parent_id):
+    Comment = apps.get_model("post", "Comment")
+    Comment.objects.filter(pk=parent_id).update(
+        total_reply=Greatest(F("total_reply") - 1, Value(0)),
+        last_reply_at=last_reply_of(OuterRef("pk")),
+        updated_at=timezone.now(),
+    )
+
+
+def touch_reply(parent_id):
+    Comment = apps.get_model("post", "Comment")
+    Comment.objects.filter(pk=parent_id).update(updated_at=timezone.now())
+
+
+def last_reply_of(comment):
+    Comment = apps.get_model("post", "Comment")
+    rows = (
+        Comment.objects.filter(parent=comment)
+        .order_by()
+        .values("parent")
+        .annotate(last=Max("created_at"))
+        .values("last")
+    )
+    return Subquery(rows)
+
+
+def rebuild_reply_counts(comment_ids=None):
+    Comment = apps.get_model("post", "Comment")
+    replies = (
+        Comment.objects.filter(parent=OuterRef("pk"))
+        .order_by()
+        .values("parent")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+
+    queryset = Comment.objects.filter(parent=None)
+    if comment_ids is not None:
+        queryset = queryset.filter(pk__in=comment_ids)
+    return queryset.update(
+        total_reply=Coalesce(Subquery(replies), 0),
+        last_reply_at=last_reply_of(OuterRef("pk")),
+    )
@@ -0,0 +1,41 @@
+"""
+Excerpt and word count of Post.description, stored on the row by Post.save()
+so post lists are served without reading the body.
+"""
+import re
+
+from django.apps import apps
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_LENGTH = 280
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def excerpt_fields(description):
+    """Return the Post field values derived from `description`."""
+    text = " ".join(strip_tags(description or "").split())
+    return {
+        "excerpt": Truncator(text).chars(EXCERPT_LENGTH),
+        "word_count": len(WORD_RE.findall(text)),
+    }
+
+
+def rebuild_excerpts(post_ids=None, batch_size=500):
+    Post = apps.get_model("post", "Post")
+
+    queryset = Post.objects.order_by("pk")
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=post_ids)
+    posts = []
+    total = 0
+    for post in queryset.only("description").iterator(chunk_size=batch_size):
+        for field, value in excerpt_fields(post.description).items():
+            setattr(post, field, value)
+        posts.append(post)
+        if len(posts) == batch_size:
+            total += Post.objects.bulk_update(posts, ["excerpt", "word_count"])
+            posts = []
+    if posts:
+        total += Post.objects.bulk_update(posts, ["excerpt", "word_count"])
+    return total
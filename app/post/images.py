@@ -0,0 +1,173 @@
+"""
+Cover image variants.
+
+The uploaded `Post.cover_image` is kept as is, and once the post is saved a
+background worker pool renders it at every width of VARIANT_WIDTHS that
+isn't larger than the original, in WebP and JPEG, next to the original
+(`posts/variants/`). The worker then stores on the row the variant names
+(`cover_variants`, {format: {width: name}}), the original dimensions and a
+tiny blurred JPEG as a data URI (`cover_placeholder`) that clients can show
+while the image loads.
+
+POST_IMAGE_MODE picks where the work runs: "pool" (default) in a thread pool
+of POST_IMAGE_WORKERS per process, "inline" in the request once it commits.
+`process_cover` can also be run for existing posts with `process_covers`.
+"""
+import base64
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps
+
+from .cache import invalidate_post
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+VARIANT_DIR = "posts/variants"
+PLACEHOLDER_WIDTH = 16
+EMPTY_FIELDS = {
+    "cover_width": None,
+    "cover_height": None,
+    "cover_placeholder": "",
+    "cover_variants": {},
+}
+
+
+def get_variant_widths(width):
+    """Widths to render for an original `width`, at least the smallest one."""
+    return [w for w in VARIANT_WIDTHS if w < width] + [min(width, VARIANT_WIDTHS[-1])]
+
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, **VARIANT_FORMATS[format])
+    return buffer.getvalue()
+
+
+def resize(image, width):
+    height = max(round(image.height * width / image.width), 1)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def make_placeholder(image):
+    small = resize(image, PLACEHOLDER_WIDTH).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    small.save(buffer, format="JPEG", quality=40)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def render_cover(file):
+    """
+    Return the update() kwargs describing `file` and its [(format, width,
+    name, content)] variants.
+    """
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+    stem = os.path.splitext(os.path.basename(file.name))[0]
+
+    variants = []
+    for width in sorted(set(get_variant_widths(image.width))):
+        resized = resize(image, width) if width != image.width else image
+        for format in VARIANT_FORMATS:
+            name = f"{VARIANT_DIR}/{stem}-{width}.{format}"
+            variants.append((format, width, name, encode(resized, format)))
+    fields = {
+        "cover_width": image.width,
+        "cover_height": image.height,
+        "cover_placeholder": make_placeholder(image),
+    }
+    return fields, variants
+
+
+def delete_variants(storage, variants):
+    for names in (variants or {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def process_cover(post_id):
+    """
+    Render the variants of the current cover of the post and store them in
+    place of the previous ones. Return whether there were variants to render.
+    """
+    Post = apps.get_model("post", "Post")
+    post = (
+        Post.objects.filter(pk=post_id)
+        .only("slug", "cover_image", "cover_variants")
+        .first()
+    )
+    if post is None:
+        return False
+    storage = post._meta.get_field("cover_image").storage
+    if not post.cover_image:
+        # Removed cover
+        Post.objects.filter(pk=post_id).filter(
+            Q(cover_image="") | Q(cover_image__isnull=True)
+        ).update(**EMPTY_FIELDS, updated_at=timezone.now())
+        delete_variants(storage, post.cover_variants)
+        invalidate_post(post.slug)
+        return False
+
+    with post.cover_image.open("rb") as file:
+        fields, variants = render_cover(file)
+    fields["cover_variants"] = {}
+    for format, width, name, content in variants:
+        saved = storage.save(name, ContentFile(content))
+        fields["cover_variants"].setdefault(format, {})[str(width)] = saved
+
+    # The cover may have been replaced while rendering
+    updated = Post.objects.filter(pk=post_id, cover_image=post.cover_image.name).update(
+        **fields, updated_at=timezone.now()
+    )
+    if not updated:
+        delete_variants(storage, fields["cover_variants"])
+        return False
+    delete_variants(storage, post.cover_variants)
+    invalidate_post(post.slug)
+    return True
+
+
+def get_workers():
+    return getattr(settings, "POST_IMAGE_WORKERS", 2)
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=get_workers(), thread_name_prefix="post-images"
+        )
+    return _executor
+
+
+def run(post_id):
+    try:
+        process_cover(post_id)
+    except Exception:
+        logger.exception("Failed to process the cover of post %s", post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post_id):
+    """Process the cover of the post once the current transaction commits."""
+    if getattr(settings, "POST_IMAGE_MODE", "pool") == "inline":
+        transaction.on_commit(lambda: process_cover(post_id))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run, post_id))
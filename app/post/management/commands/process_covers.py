@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from post.images import process_cover
+from post.management.commands.rebuild_counters import batched_ids
+from post.models import Post
+
+
+class Command(BaseCommand):
+    help = "Render the cover variants of posts whose cover has none yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch_size", type=int, default=100)
+        parser.add_argument(
+            "--all", action="store_true", help="Render every cover again"
+        )
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.exclude(cover_image="").exclude(cover_image=None)
+        if not options["all"]:
+            queryset = queryset.filter(cover_variants={})
+
+        total = 0
+        for post_ids in batched_ids(queryset, options["batch_size"]):
+            for post_id in post_ids:
+                try:
+                    total += process_cover(post_id)
+                except Exception as exc:
+                    self.stderr.write(f"Post {post_id}: {exc}")
+        self.stdout.write(f"Processed {total} covers")
@@ -0,0 +1,47 @@
+import time
+
+from base.cache import is_process_local
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from post.cache import post_cache
+from post.publishing import next_publish_at, publish_due_posts
+
+
+class Command(BaseCommand):
+    help = "Publish scheduled posts whose publish_at has passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep running and publish on time"
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Longest sleep between two runs in --loop mode",
+        )
+        parser.add_argument("--batch_size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if is_process_local(post_cache.cache):
+            # The API workers would keep serving their cached lists without
+            # the new posts until RESPONSE_CACHE_TIMEOUT
+            raise CommandError(
+                "The response cache is local to each process, set "
+                "RESPONSE_CACHE_URL to a cache shared with the API workers"
+            )
+        while True:
+            posts = publish_due_posts(batch_size=options["batch_size"])
+            if posts or not options["loop"]:
+                self.stdout.write(f"Published {len(posts)} posts")
+            if not options["loop"]:
+                return
+
+            # Wake up for the next scheduled post rather than a fixed tick
+            delay = options["interval"]
+            upcoming = next_publish_at()
+            if upcoming is not None:
+                delay = min(delay, (upcoming - timezone.now()).total_seconds())
+            close_old_connections()
+            time.sleep(max(delay, 0.05))
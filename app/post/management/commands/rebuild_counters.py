@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from post.counters import get_counter, rebuild_counts, rebuild_reply_counts
+from post.models import Comment, Post
+from post.ranking import rebuild_scores
+
+
+def batched_ids(queryset, batch_size):
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the post counters and ranking scores, Comment.total_reply "
+        "and Comment.last_reply_at from the source tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch_size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        get_counter().flush()
+
+        total = 0
+        for post_ids in batched_ids(Post.objects.all(), batch_size):
+            total += rebuild_counts(post_ids=post_ids)
+            rebuild_scores(post_ids=post_ids)
+        self.stdout.write(f"Rebuilt counters for {total} posts")
+
+        total = 0
+        comments = Comment.objects.filter(parent=None)
+        for comment_ids in batched_ids(comments, batch_size):
+            total += rebuild_reply_counts(comment_ids=comment_ids)
+        self.stdout.write(f"Rebuilt counters for {total} comments")
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:21
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_reactions(apps, schema_editor):
+    Post = apps.get_model("post", "Post")
+    Reaction = apps.get_model("post", "Reaction")
+
+    duplicates = (
+        Reaction.objects.values("user_id", "post_id")
+        .annotate(keep_id=Min("id"), total=Count("id"))
+        .filter(total__gt=1)
+    )
+    post_ids = set()
+    for duplicate in duplicates.iterator():
+        Reaction.objects.filter(
+            user_id=duplicate["user_id"], post_id=duplicate["post_id"]
+        ).exclude(id=duplicate["keep_id"]).delete()
+        post_ids.add(duplicate["post_id"])
+
+    reactions = (
+        Reaction.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+    Post.objects.filter(pk__in=post_ids).update(
+        total_reaction=Coalesce(Subquery(reactions), 0)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0007_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "parent", "-id"], name="comment_thread_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("publish_at__isnull", False)),
+                fields=["-publish_at", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["author", "-id"], name="post_author_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["created_at"], name="post_created_at_idx"),
+        ),
+        migrations.RunPython(remove_duplicate_reactions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="reaction",
+            constraint=models.UniqueConstraint(
+                fields=("user", "post"), name="reaction_user_post_uniq"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0008_index_plan"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-publish_at", "-id"],
+                name="post_author_published_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:44
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def publish_past_posts(apps, schema_editor):
+    Post = apps.get_model("post", "Post")
+    Post.objects.filter(publish_at__lte=timezone.now()).update(is_published=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0009_post_author_published_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="post",
+            name="post_published_idx",
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="is_published",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(publish_past_posts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-publish_at", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_published", False), ("publish_at__isnull", False)
+                ),
+                fields=["publish_at"],
+                name="post_scheduled_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:48
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_existing_replies(apps, schema_editor):
+    """post.counters.rebuild_reply_counts as of this migration."""
+    Comment = apps.get_model("post", "Comment")
+    replies = (
+        Comment.objects.filter(parent=models.OuterRef("pk")).order_by().values("parent")
+    )
+    Comment.objects.filter(parent=None).update(
+        total_reply=Coalesce(
+            models.Subquery(replies.annotate(total=models.Count("id")).values("total")),
+            0,
+        ),
+        last_reply_at=models.Subquery(
+            replies.annotate(last=models.Max("created_at")).values("last")
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0010_post_is_published"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="last_reply_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="total_reply",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                condition=models.Q(("parent__isnull", True)),
+                fields=["post", "-total_reply", "-id"],
+                name="comment_active_idx",
+            ),
+        ),
+        migrations.RunPython(count_existing_replies, migrations.RunPython.noop),
+    ]
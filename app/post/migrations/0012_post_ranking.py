@@ -0,0 +1,88 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:52
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+ACTIVITY_WEIGHTS = {"total_comment": 2, "total_reaction": 1}
+
+
+def score_existing_posts(apps, schema_editor):
+    """post.ranking.rebuild_scores as of this migration."""
+    Post = apps.get_model("post", "Post")
+    Comment = apps.get_model("post", "Comment")
+    Reaction = apps.get_model("post", "Reaction")
+    half_life = getattr(settings, "POST_TRENDING_HALF_LIFE", 24) * 3600
+
+    def term(at, weight=1):
+        return math.log2(weight) + (at - EPOCH).total_seconds() / half_life
+
+    def log2_add(a, b):
+        return max(a, b) + math.log2(1 + 2 ** -abs(a - b))
+
+    post_ids = list(Post.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        posts = list(
+            Post.objects.filter(pk__in=post_ids[start : start + BATCH_SIZE]).only(
+                "publish_at", "is_published", *ACTIVITY_WEIGHTS
+            )
+        )
+        scores = {
+            post.pk: term(post.publish_at) if post.is_published else 0.0
+            for post in posts
+        }
+        for model, field in [(Comment, "total_comment"), (Reaction, "total_reaction")]:
+            activities = model.objects.filter(post_id__in=list(scores)).values_list(
+                "post_id", "created_at"
+            )
+            for post_id, created_at in activities.iterator():
+                scores[post_id] = log2_add(
+                    scores[post_id], term(created_at, ACTIVITY_WEIGHTS[field])
+                )
+        for post in posts:
+            post.trending_score = scores[post.pk]
+            post.top_score = sum(
+                getattr(post, field) * weight
+                for field, weight in ACTIVITY_WEIGHTS.items()
+            )
+        Post.objects.bulk_update(posts, ["trending_score", "top_score"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0011_comment_reply_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="top_score",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="trending_score",
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-trending_score", "-id"],
+                name="post_trending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-top_score", "-id"],
+                name="post_top_idx",
+            ),
+        ),
+        migrations.RunPython(score_existing_posts, migrations.RunPython.noop),
+    ]
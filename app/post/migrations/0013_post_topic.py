@@ -0,0 +1,144 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:54
+
+import django.db.models.deletion
+import taggit.managers
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+SEARCH_CONFIG = "english"
+
+
+def move_post_topics(apps, schema_editor):
+    """Copy the taggit TaggedItem rows of posts into PostTopic."""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    Post = apps.get_model("post", "Post")
+    PostTopic = apps.get_model("post", "PostTopic")
+
+    items = TaggedItem.objects.filter(
+        content_type__in=ContentType.objects.filter(app_label="post", model="post")
+    )
+    rows = items.filter(object_id__in=Post.objects.values("id")).values_list(
+        "object_id", "tag_id"
+    )
+    batch = []
+    for object_id, tag_id in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(PostTopic(content_object_id=object_id, tag_id=tag_id))
+        if len(batch) == BATCH_SIZE:
+            PostTopic.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PostTopic.objects.bulk_create(batch, ignore_conflicts=True)
+    items.delete()
+
+
+def restore_post_topics(apps, schema_editor):
+    """Copy the PostTopic rows back into taggit's TaggedItem."""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    PostTopic = apps.get_model("post", "PostTopic")
+
+    content_type, _ = ContentType.objects.get_or_create(app_label="post", model="post")
+    rows = PostTopic.objects.values_list("content_object_id", "tag_id")
+    batch = []
+    for object_id, tag_id in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.append(
+            TaggedItem(content_type=content_type, object_id=object_id, tag_id=tag_id)
+        )
+        if len(batch) == BATCH_SIZE:
+            TaggedItem.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TaggedItem.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def index_existing_posts(apps, schema_editor):
+    """Fill the search vector of post.search, inlined as of this migration."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Post = apps.get_model("post", "Post")
+    PostTopic = apps.get_model("post", "PostTopic")
+
+    names = (
+        PostTopic.objects.filter(content_object=models.OuterRef("pk"))
+        .order_by()
+        .values("content_object")
+        .annotate(names=StringAgg("tag__name", delimiter=" "))
+        .values("names")
+    )
+    topics = Coalesce(
+        models.Subquery(names), models.Value(""), output_field=models.TextField()
+    )
+    Post.objects.update(
+        search_vector=SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(topics, weight="A", config=SEARCH_CONFIG)
+        + SearchVector("short_description", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("taggit", "0005_auto_20220424_2025"),
+        ("post", "0012_post_ranking"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostTopic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_object",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="topic_items",
+                        to="post.post",
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="%(app_label)s_%(class)s_items",
+                        to="taggit.tag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="topics",
+            field=taggit.managers.TaggableManager(
+                help_text="A comma-separated list of tags.",
+                through="post.PostTopic",
+                to="taggit.Tag",
+                verbose_name="Tags",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posttopic",
+            index=models.Index(
+                fields=["content_object", "tag"], name="post_topic_post_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="posttopic",
+            constraint=models.UniqueConstraint(
+                fields=("tag", "content_object"), name="post_topic_uniq"
+            ),
+        ),
+        migrations.RunPython(move_post_topics, restore_post_topics),
+        migrations.RunPython(index_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.10 on 2026-10-18 13:02
+
+import re
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+EXCERPT_LENGTH = 280
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def excerpt_existing_posts(apps, schema_editor):
+    """post.excerpts.rebuild_excerpts as of this migration."""
+    Post = apps.get_model("post", "Post")
+
+    posts = []
+    queryset = Post.objects.order_by("pk").only("description")
+    for post in queryset.iterator(chunk_size=BATCH_SIZE):
+        text = " ".join(strip_tags(post.description or "").split())
+        post.excerpt = Truncator(text).chars(EXCERPT_LENGTH)
+        post.word_count = len(WORD_RE.findall(text))
+        posts.append(post)
+        if len(posts) == BATCH_SIZE:
+            Post.objects.bulk_update(posts, ["excerpt", "word_count"])
+            posts = []
+    Post.objects.bulk_update(posts, ["excerpt", "word_count"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0013_post_topic"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="excerpt",
+            field=models.CharField(blank=True, editable=False, max_length=280),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(excerpt_existing_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.10 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("post", "0014_post_excerpt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="cover_height",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="cover_placeholder",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="cover_variants",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="cover_width",
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+    ]
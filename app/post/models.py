@@ -1,9 +1,17 @@
-from base.utils import create_slug
+from base.utils import save_with_slug
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from taggit.managers import TaggableManager
+from taggit.models import TaggedItemBase
+
+from . import counters, excerpts, images, publishing, ranking, search
+from .cache import invalidate_post
+from .signals import post_published
 
 User = get_user_model()
 
@@ -14,32 +22,136 @@ class Post(models.Model):
     slug = models.SlugField(max_length=255, unique=True)
     short_description = models.CharField(blank=True)
     cover_image = models.ImageField(upload_to="posts", null=True)
+    # Set by post.images once the cover is processed
+    cover_width = models.PositiveIntegerField(null=True, editable=False)
+    cover_height = models.PositiveIntegerField(null=True, editable=False)
+    cover_placeholder = models.TextField(blank=True, editable=False)
+    cover_variants = models.JSONField(default=dict, editable=False)
     description = models.TextField()
+    # Derived from description for the post lists, see post.excerpts
+    excerpt = models.CharField(
+        max_length=excerpts.EXCERPT_LENGTH, blank=True, editable=False
+    )
+    word_count = models.PositiveIntegerField(default=0, editable=False)
     total_comment = models.PositiveIntegerField(default=0)
     total_reaction = models.PositiveIntegerField(default=0)
+    # Ranking scores, see post.ranking
+    top_score = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)
 
     publish_at = models.DateTimeField(null=True)
+    # Set once publish_at has passed, see post.publishing
+    is_published = models.BooleanField(default=False, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    topics = TaggableManager()
+    topics = TaggableManager(through="PostTopic")
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+            # Public feed: published posts ordered by (-publish_at, -id)
+            models.Index(
+                fields=["-publish_at", "-id"],
+                name="post_published_idx",
+                condition=models.Q(is_published=True),
+            ),
+            # Scheduled posts waiting for publish_due_posts()
+            models.Index(
+                fields=["publish_at"],
+                name="post_scheduled_idx",
+                condition=models.Q(is_published=False, publish_at__isnull=False),
+            ),
+            # ?ordering=trending and ?ordering=top_week|top_all
+            models.Index(
+                fields=["-trending_score", "-id"],
+                name="post_trending_idx",
+                condition=models.Q(is_published=True),
+            ),
+            models.Index(
+                fields=["-top_score", "-id"],
+                name="post_top_idx",
+                condition=models.Q(is_published=True),
+            ),
+            # Author's own posts ordered by -id
+            models.Index(fields=["author", "-id"], name="post_author_idx"),
+            # Feed posts of followed authors merged at read time
+            models.Index(
+                fields=["author", "-publish_at", "-id"],
+                name="post_author_published_idx",
+            ),
+            models.Index(fields=["created_at"], name="post_created_at_idx"),
+        ]
+
+    # Cover name as loaded, None when it wasn't
+    _loaded_cover = ""
 
     def __str__(self) -> str:
         return f"{self.title[:32]}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_cover = (
+            values[field_names.index("cover_image")] or ""
+            if "cover_image" in field_names
+            else None
+        )
+        return instance
+
+    def cover_changed(self):
+        if self._loaded_cover is None or "cover_image" in self.get_deferred_fields():
+            return False
+        return (self.cover_image.name or "") != self._loaded_cover
+
     def save(self, *args, **kwargs):
+        cover_changed = self.cover_changed()
+        was_published = self.is_published and not self._state.adding
+        self.is_published = bool(self.publish_at and self.publish_at <= timezone.now())
+        if "description" not in self.get_deferred_fields():
+            for field, value in excerpts.excerpt_fields(self.description).items():
+                setattr(self, field, value)
+        if self.is_published and not was_published:
+            self.trending_score = ranking.log2_add(
+                self.trending_score, ranking.activity_term(self.publish_at)
+            )
         if not self.pk and not self.slug:
-            self.slug = create_slug(Post, source_data=self.title, dest_field="slug")
-        return super().save(*args, **kwargs)
+            save_with_slug(
+                self, lambda: super(Post, self).save(*args, **kwargs), self.title
+            )
+        else:
+            super().save(*args, **kwargs)
+        if self.is_published and not was_published:
+            publishing.send_published(self)
+        if cover_changed:
+            self._loaded_cover = self.cover_image.name or ""
+            images.schedule(self.pk)
+
+    def refresh_counts(self):
+        counters.rebuild_counts(post_ids=[self.pk])
+        self.refresh_from_db(fields=counters.COUNTER_FIELDS)
 
-    def handle_comment_count(self):
-        self.total_comment = self.comments.count()  # type: ignore
-        self.save()
 
-    def handle_reaction_count(self):
-        self.total_comment = self.reactions.count()  # type: ignore
-        self.save()
+class PostTopic(TaggedItemBase):
+    """Post-topic rows keyed by integer ids, instead of taggit's generic items."""
+
+    content_object = models.ForeignKey(
+        Post, related_name="topic_items", on_delete=models.CASCADE, db_index=False
+    )
+
+    class Meta:
+        constraints = [
+            # Also the topic -> posts index of the topic filters
+            models.UniqueConstraint(
+                fields=["tag", "content_object"], name="post_topic_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["content_object", "tag"], name="post_topic_post_idx"),
+        ]
 
 
 class Comment(models.Model):
@@ -50,12 +162,26 @@ class Comment(models.Model):
     )
 
     description = models.TextField()
+    # Maintained on the parent when replies are created or deleted, see
+    # post.counters
+    total_reply = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-id"]
+        indexes = [
+            # Top level comments / replies of a post ordered by -id
+            models.Index(fields=["post", "parent", "-id"], name="comment_thread_idx"),
+            # Most active top level comments of a post
+            models.Index(
+                fields=["post", "-total_reply", "-id"],
+                name="comment_active_idx",
+                condition=models.Q(parent__isnull=True),
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"post_id:{self.post_id} :: parent:{not self.parent_id} :: {self.description[:32]} "  # type: ignore
@@ -69,28 +195,75 @@ class Reaction(models.Model):
 
     class Meta:
         ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="reaction_user_post_uniq"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.post_id} :: {self.user_id}"  # type: ignore
 
 
+def get_post_slug(instance):
+    if type(instance).post.is_cached(instance):
+        return instance.post.slug
+    return (
+        Post.objects.filter(pk=instance.post_id).values_list("slug", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_post_save_receiver(sender, instance, **kwargs):
+    search.index_posts([instance.pk])
+    invalidate_post(instance.slug)
+
+
+@receiver(post_published, sender=Post)
+def post_published_receiver(sender, instance, **kwargs):
+    invalidate_post(instance.slug)
+
+
+@receiver(post_delete, sender=Post)
+def post_post_delete_receiver(sender, instance, **kwargs):
+    invalidate_post(instance.slug)
+
+
+@receiver(m2m_changed, sender=Post.topics.through)
+def post_topics_change_receiver(sender, instance, action, **kwargs):
+    if isinstance(instance, Post) and action.startswith("post_"):
+        search.index_posts([instance.pk])
+        Post.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+        invalidate_post(instance.slug)
+
+
 @receiver(post_save, sender=Comment)
 def comment_post_save_receiver(sender, instance, created, **kwargs):
     if created:
-        instance.post.handle_comment_count()
+        counters.incr(instance.post_id, "total_comment", 1, instance.created_at)
+        if instance.parent_id:
+            counters.add_reply(instance.parent_id, instance.created_at)
+    elif instance.parent_id:
+        counters.touch_reply(instance.parent_id)
+    invalidate_post(get_post_slug(instance))
 
 
 @receiver(post_delete, sender=Comment)
 def comment_post_delete_receiver(sender, instance, **kwargs):
-    instance.post.handle_comment_count()
+    counters.incr(instance.post_id, "total_comment", -1, instance.created_at)
+    if instance.parent_id:
+        counters.remove_reply(instance.parent_id)
+    invalidate_post(get_post_slug(instance))
 
 
 @receiver(post_save, sender=Reaction)
 def reaction_post_save_receiver(sender, instance, created, **kwargs):
     if created:
-        instance.post.handle_comment_count()
+        counters.incr(instance.post_id, "total_reaction", 1, instance.created_at)
+    invalidate_post(get_post_slug(instance))
 
 
 @receiver(post_delete, sender=Reaction)
 def reaction_post_delete_receiver(sender, instance, **kwargs):
-    instance.post.handle_comment_count()
+    counters.incr(instance.post_id, "total_reaction", -1, instance.created_at)
+    invalidate_post(get_post_slug(instance))
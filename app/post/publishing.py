@@ -0,0 +1,53 @@
+"""
+Scheduled publishing.
+
+Posts are public once `is_published` is set, so public reads filter on a
+stable flag instead of `publish_at < now()`. Post.save() sets it right away
+when publish_at has passed; `publish_due_posts()` flips scheduled posts when
+their time comes. Either way `post_published` is sent after the commit, which
+drops the cached pages at the moment the post goes live.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from . import ranking
+from .signals import post_published
+
+
+def send_published(post):
+    transaction.on_commit(lambda: post_published.send(sender=type(post), instance=post))
+
+
+def publish_due_posts(now=None, batch_size=500):
+    """Publish every post whose publish_at has passed, return them."""
+    Post = apps.get_model("post", "Post")
+    now = now or timezone.now()
+    published = []
+    while True:
+        with transaction.atomic():
+            # Concurrent workers skip the rows another one is publishing
+            posts = list(
+                Post.objects.select_for_update(skip_locked=True)
+                .filter(is_published=False, publish_at__lte=now)
+                .order_by("publish_at")[:batch_size]
+            )
+            Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+                is_published=True, **ranking.published_update()
+            )
+            for post in posts:
+                post.is_published = True
+                send_published(post)
+        published += posts
+        if len(posts) < batch_size:
+            return published
+
+
+def next_publish_at():
+    Post = apps.get_model("post", "Post")
+    return (
+        Post.objects.filter(is_published=False, publish_at__isnull=False)
+        .order_by("publish_at")
+        .values_list("publish_at", flat=True)
+        .first()
+    )
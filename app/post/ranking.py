@@ -0,0 +1,124 @@
+"""
+Post ranking for `?ordering=trending|top_week|top_all`.
+
+Both scores are stored on Post and indexed, so a ranked page is an index scan
+like the default feed:
+
+- `top_score`: reactions and comments weighted by ACTIVITY_WEIGHTS, moved with
+  the counters (see post.counters).
+- `trending_score`: time-decayed activity. Every reaction or comment at time t
+  adds `weight * 2 ** ((t - EPOCH) / half_life)`, and so does publishing. Newer
+  activity is worth exponentially more, so older scores never need decaying:
+  comparing two posts is the same as comparing their decayed sums today. The
+  sum is stored as its log2 so it stays finite, which makes adding or
+  removing an activity a single UPDATE of the row.
+
+`rebuild_scores` recomputes both from the source tables.
+"""
+import math
+from datetime import datetime, timezone
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Abs, Extract, Greatest, Least, Ln, Power
+
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+ACTIVITY_WEIGHTS = {"total_comment": 2, "total_reaction": 1}
+# log2 of the smallest remainder kept when removing an activity
+MIN_REMAINDER = -52.0
+# Lowest power of 2 computed in SQL: 2 ** -1000 is still a normal double,
+# while PostgreSQL raises an underflow error on results too small for one
+MIN_EXPONENT = -1000.0
+TOP_WEEK_DAYS = 7
+
+
+def get_half_life():
+    return getattr(settings, "POST_TRENDING_HALF_LIFE", 24) * 3600
+
+
+def activity_term(at, weight=1):
+    """log2 of the decayed weight of an activity at `at`."""
+    return math.log2(weight) + (at - EPOCH).total_seconds() / get_half_life()
+
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) without leaving the log space."""
+    return max(a, b) + math.log2(1 + 2 ** -abs(a - b))
+
+
+def sql_log2(expression):
+    return Ln(expression) / Value(math.log(2))
+
+
+def sql_exp2(exponent):
+    """2 ** exponent, where exponents under MIN_EXPONENT count as zero."""
+    return Power(Value(2.0), Greatest(exponent, Value(MIN_EXPONENT)))
+
+
+def sql_log2_add(score, term):
+    # A draft's score of 0 is ~2500 half-lives below any activity term
+    return Greatest(score, term) + sql_log2(Value(1.0) + sql_exp2(-Abs(score - term)))
+
+
+def sql_log2_sub(score, term):
+    """log2(2 ** score - 2 ** term), for an activity already in `score`."""
+    # A term above the score leaves no remainder either way
+    remainder = Value(1.0) - sql_exp2(Least(term - score, Value(0.0)))
+    return score + sql_log2(Greatest(remainder, Value(2**MIN_REMAINDER)))
+
+
+def trending_update(added=None, removed=None):
+    """
+    Return the update() kwargs that fold the log2 sums of added and removed
+    activity into `trending_score`.
+    """
+    if added is None and removed is None:
+        return {}
+    score = F("trending_score")
+    if added is not None:
+        score = sql_log2_add(score, Value(added))
+    if removed is not None:
+        score = Greatest(sql_log2_sub(score, Value(removed)), Value(0.0))
+    return {"trending_score": score}
+
+
+def published_update():
+    """update() kwargs adding the publishing of the post to `trending_score`."""
+    term = ExpressionWrapper(
+        (Extract("publish_at", "epoch") - Value(EPOCH.timestamp()))
+        / Value(float(get_half_life())),
+        output_field=FloatField(),
+    )
+    return {"trending_score": sql_log2_add(F("trending_score"), term)}
+
+
+def rebuild_scores(post_ids=None):
+    Post = apps.get_model("post", "Post")
+    Comment = apps.get_model("post", "Comment")
+    Reaction = apps.get_model("post", "Reaction")
+
+    queryset = Post.objects.all()
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=post_ids)
+    posts = list(
+        queryset.only("publish_at", "is_published", *ACTIVITY_WEIGHTS).order_by()
+    )
+    scores = {
+        post.pk: activity_term(post.publish_at) if post.is_published else 0.0
+        for post in posts
+    }
+    for model, field in [(Comment, "total_comment"), (Reaction, "total_reaction")]:
+        activities = model.objects.filter(post_id__in=list(scores)).values_list(
+            "post_id", "created_at"
+        )
+        for post_id, created_at in activities.iterator():
+            term = activity_term(created_at, ACTIVITY_WEIGHTS[field])
+            scores[post_id] = log2_add(scores[post_id], term)
+
+    for post in posts:
+        post.trending_score = scores[post.pk]
+        post.top_score = sum(
+            getattr(post, field) * weight for field, weight in ACTIVITY_WEIGHTS.items()
+        )
+    return Post.objects.bulk_update(posts, ["trending_score", "top_score"])
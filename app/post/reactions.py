@@ -0,0 +1,141 @@
+"""
+Reaction writes by post slug.
+
+Adding reactions is one statement on PostgreSQL: the posts are looked up by
+slug and the reactions inserted with ON CONFLICT DO NOTHING in the same
+query, which returns which posts exist and which reactions are new. Removing
+is a single DELETE ... RETURNING. Only the reactions actually inserted or
+deleted move the counters, all in one `counters.incr_many` (queued in the
+buffered mode), so retries and duplicates are harmless. The Reaction signals
+are not sent; their work is done here.
+"""
+from django.apps import apps
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters
+from .cache import invalidate_posts
+
+# Posts per list of a batch request
+BATCH_LIMIT = 100
+
+ADD_SQL = """
+WITH target AS (
+    SELECT id, slug FROM {post} WHERE slug = ANY(%s)
+), inserted AS (
+    INSERT INTO {reaction} (user_id, post_id, created_at)
+    SELECT %s, id, %s FROM target
+    ON CONFLICT (user_id, post_id) DO NOTHING
+    RETURNING post_id
+)
+SELECT target.id, target.slug, inserted.post_id IS NOT NULL
+FROM target LEFT JOIN inserted ON inserted.post_id = target.id
+"""
+
+REMOVE_SQL = """
+DELETE FROM {reaction} AS reaction USING {post} AS post
+WHERE reaction.post_id = post.id AND reaction.user_id = %s AND post.slug = ANY(%s)
+RETURNING post.id, post.slug, reaction.created_at
+"""
+
+
+def get_tables():
+    Post = apps.get_model("post", "Post")
+    Reaction = apps.get_model("post", "Reaction")
+    quote_name = connection.ops.quote_name
+    return {
+        "post": quote_name(Post._meta.db_table),
+        "reaction": quote_name(Reaction._meta.db_table),
+    }
+
+
+def insert_reactions(user_id, slugs, now):
+    """Return [(post_id, slug, created)] of the posts of `slugs` that exist."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(ADD_SQL.format(**get_tables()), [list(slugs), user_id, now])
+            return cursor.fetchall()
+
+    Post = apps.get_model("post", "Post")
+    Reaction = apps.get_model("post", "Reaction")
+    posts = Post.objects.filter(slug__in=slugs).values_list("id", "slug")
+    existing = set(
+        Reaction.objects.filter(user_id=user_id, post__slug__in=slugs).values_list(
+            "post_id", flat=True
+        )
+    )
+    rows = [(post_id, slug, post_id not in existing) for post_id, slug in posts]
+    Reaction.objects.bulk_create(
+        [
+            Reaction(user_id=user_id, post_id=post_id, created_at=now)
+            for post_id, _, created in rows
+            if created
+        ],
+        ignore_conflicts=True,
+    )
+    return rows
+
+
+def delete_reactions(user_id, slugs):
+    """Return [(post_id, slug, created_at)] of the reactions deleted."""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(REMOVE_SQL.format(**get_tables()), [user_id, list(slugs)])
+            return cursor.fetchall()
+
+    Reaction = apps.get_model("post", "Reaction")
+    reactions = Reaction.objects.filter(user_id=user_id, post__slug__in=slugs)
+    rows = list(reactions.values_list("pk", "post_id", "post__slug", "created_at"))
+    if rows:
+        # A plain DELETE, the ORM one would send the signals again
+        placeholders = ", ".join(["%s"] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {get_tables()['reaction']} WHERE id IN ({placeholders})",
+                [pk for pk, *_ in rows],
+            )
+    return [row[1:] for row in rows]
+
+
+def update_reactions(user, add=(), remove=()):
+    """
+    React as `user` on the posts of `add` and remove the reactions on those
+    of `remove`. Return ({slug: created}, [slug]): the posts of `add` found,
+    `created` being False where the reaction already existed, and the slugs of
+    the reactions removed.
+    """
+    now = timezone.now()
+    with transaction.atomic(savepoint=False):
+        added = insert_reactions(user.pk, sorted(set(add)), now) if add else []
+        removed = delete_reactions(user.pk, sorted(set(remove))) if remove else []
+        changes = [
+            (post_id, "total_reaction", 1, now)
+            for post_id, _, created in added
+            if created
+        ] + [
+            (post_id, "total_reaction", -1, created_at)
+            for post_id, _, created_at in removed
+        ]
+        if changes:
+            counters.incr_many(changes)
+            invalidate_posts(
+                [slug for _, slug, created in added if created]
+                + [slug for _, slug, _ in removed]
+            )
+    return (
+        {slug: created for _, slug, created in added},
+        [slug for _, slug, _ in removed],
+    )
+
+
+def add_reactions(user, slugs):
+    """
+    React as `user` on the posts of `slugs`. Return {slug: created} for the
+    posts found, `created` being False where the reaction already existed.
+    """
+    return update_reactions(user, add=slugs)[0]
+
+
+def remove_reactions(user, slugs):
+    """Remove the reactions of `user` on the posts of `slugs`, return their slugs."""
+    return update_reactions(user, remove=slugs)[1]
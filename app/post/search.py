@@ -0,0 +1,167 @@
+"""
+Full-text search over posts.
+
+On PostgreSQL every post keeps a weighted `search_vector` (title and topics
+first, then short description, then description) backed by a GIN index, and
+queries are ranked with ts_rank. Every term is prefix matched, so "djan"
+finds "django". Other databases (SQLite test runs) fall back to an in-memory
+inverted index built from the candidate rows.
+"""
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.postgres import search as pg_search
+from django.contrib.postgres.aggregates import StringAgg
+from django.db import connections, models
+from django.db.models.functions import Cast, Coalesce
+
+SEARCH_CONFIG = "english"
+RANK_FIELD = "search_rank"
+WEIGHTS = {"A": 1.0, "B": 0.4, "C": 0.2}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or "")]
+
+
+def uses_postgres(queryset):
+    return connections[queryset.db].vendor == "postgresql"
+
+
+def topic_names(post_ref="pk"):
+    PostTopic = apps.get_model("post", "PostTopic")
+    names = (
+        PostTopic.objects.filter(content_object=models.OuterRef(post_ref))
+        .order_by()
+        .values("content_object")
+        .annotate(names=StringAgg("tag__name", delimiter=" "))
+        .values("names")
+    )
+    return Coalesce(
+        models.Subquery(names), models.Value(""), output_field=models.TextField()
+    )
+
+
+def search_vector():
+    return (
+        pg_search.SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + pg_search.SearchVector(topic_names(), weight="A", config=SEARCH_CONFIG)
+        + pg_search.SearchVector("short_description", weight="B", config=SEARCH_CONFIG)
+        + pg_search.SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset):
+    if uses_postgres(queryset):
+        queryset.update(search_vector=search_vector())
+
+
+def index_posts(post_ids):
+    Post = apps.get_model("post", "Post")
+    update_search_vector(Post.objects.filter(pk__in=post_ids))
+
+
+class InvertedIndex:
+    """Token -> {post_id: weight} index with sorted tokens for prefix lookups."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.tokens = []
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        index = cls()
+        Post = queryset.model
+        PostTopic = apps.get_model("post", "PostTopic")
+
+        topics = defaultdict(list)
+        for post_id, name in PostTopic.objects.filter(
+            content_object__in=queryset.values("pk")
+        ).values_list("content_object", "tag__name"):
+            topics[post_id].append(name)
+
+        rows = Post.objects.filter(pk__in=queryset.values("pk")).values_list(
+            "pk", "title", "short_description", "description"
+        )
+        for pk, title, short_description, description in rows:
+            index.add(pk, "A", title, " ".join(topics[pk]))
+            index.add(pk, "B", short_description)
+            index.add(pk, "C", description)
+        index.tokens = sorted(index.postings)
+        return index
+
+    def add(self, post_id, weight, *texts):
+        for text in texts:
+            for token in tokenize(text):
+                postings = self.postings[token]
+                postings[post_id] = postings.get(post_id, 0) + WEIGHTS[weight]
+
+    def expand(self, term):
+        start = bisect_left(self.tokens, term)
+        for token in self.tokens[start:]:
+            if not token.startswith(term):
+                break
+            yield token
+
+    def search(self, text):
+        """Return {post_id: rank} of posts matching every term of `text`."""
+        scores = None
+        for term in tokenize(text):
+            term_scores = defaultdict(float)
+            for token in self.expand(term):
+                for post_id, weight in self.postings[token].items():
+                    term_scores[post_id] += weight
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    post_id: score + term_scores[post_id]
+                    for post_id, score in scores.items()
+                    if post_id in term_scores
+                }
+        return {post_id: math.log1p(score) for post_id, score in (scores or {}).items()}
+
+
+def build_query(text):
+    terms = tokenize(text)
+    if not terms:
+        return None
+    raw = " & ".join(f"{term}:*" for term in terms)
+    return pg_search.SearchQuery(raw, search_type="raw", config=SEARCH_CONFIG)
+
+
+def search_posts(queryset, text):
+    """Filter `queryset` to posts matching `text`, annotated with RANK_FIELD."""
+    if not tokenize(text):
+        return queryset.annotate(**{RANK_FIELD: models.Value(0.0, models.FloatField())})
+
+    if uses_postgres(queryset):
+        query = build_query(text)
+        return queryset.filter(search_vector=query).annotate(
+            # ts_rank is a real; cast so cursors round-trip the exact value
+            **{
+                RANK_FIELD: Cast(
+                    pg_search.SearchRank(models.F("search_vector"), query),
+                    models.FloatField(),
+                )
+            }
+        )
+
+    ranks = InvertedIndex.from_queryset(queryset).search(text)
+    return queryset.filter(pk__in=ranks).annotate(
+        **{
+            RANK_FIELD: models.Case(
+                *[
+                    models.When(pk=pk, then=models.Value(rank))
+                    for pk, rank in ranks.items()
+                ],
+                default=models.Value(0.0),
+                output_field=models.FloatField(),
+            )
+        }
+    )
@@ -1,37 +1,117 @@
 from datetime import timedelta
 
+from django.db.models import Manager
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from taggit.models import Tag
 from taggit.serializers import TaggitSerializer, TagListSerializerField
-from user.serializers import UserMinimalSerializer
+from user.serializers import ProfileField, ProfileListSerializer
+
+from . import models, reactions, uploads
+
+
+def get_my_reactions(context, posts):
+    """
+    Return {post_id: reacted} for the request user, resolving every post that
+    is not cached in the serializer context yet with a single query.
+    """
+    reactions = context.setdefault("my_reactions", {})
+    request = context.get("request")
+    user = request and request.user
+    if not (user and user.is_authenticated):
+        return reactions
+
+    missing = [post.pk for post in posts if post.pk not in reactions]
+    if missing:
+        reacted = set(
+            models.Reaction.objects.filter(user=user, post_id__in=missing).values_list(
+                "post_id", flat=True
+            )
+        )
+        reactions.update({post_id: post_id in reacted for post_id in missing})
+    return reactions
+
+
+async def aget_my_reactions(user, posts):
+    """Async `get_my_reactions`, for priming the context before serializing."""
+    if not (user and user.is_authenticated and posts):
+        return {}
+    post_ids = [post.pk for post in posts]
+    reacted = {
+        post_id
+        async for post_id in models.Reaction.objects.filter(
+            user=user, post_id__in=post_ids
+        ).values_list("post_id", flat=True)
+    }
+    return {post_id: post_id in reacted for post_id in post_ids}
+
+
+class ReactionAwareListSerializer(ProfileListSerializer):
+    def to_representation(self, data):
+        posts = data.all() if isinstance(data, Manager) else data
+        get_my_reactions(self.context, posts)
+        return super().to_representation(posts)
+
+
+class CoverVariantsField(serializers.ReadOnlyField):
+    """{format: {width: url}} of the cover variants rendered by post.images."""
+
+    def to_representation(self, variants):
+        storage = models.Post._meta.get_field("cover_image").storage
+        request = self.context.get("request")
+
+        def get_url(name):
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            format: {width: get_url(name) for width, name in names.items()}
+            for format, names in (variants or {}).items()
+        }
 
-from . import models
 
+class CoverImageField(serializers.ImageField):
+    """Takes the covers already verified by post.uploads as they are."""
 
-class PostSerializer(TaggitSerializer, serializers.ModelSerializer):
-    topics = TagListSerializerField()
-    author = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    author_profile = UserMinimalSerializer(read_only=True, source="author")
+    def to_internal_value(self, data):
+        if isinstance(data, uploads.CoverUpload):
+            return data
+        return super().to_internal_value(data)
+
+
+class HasMyReactionMixin(serializers.Serializer):
     has_my_reaction = serializers.SerializerMethodField()
 
     def get_has_my_reaction(self, post):
-        user = self.context["request"].user
-        if user and user.is_authenticated:
-            return models.Reaction.objects.filter(user=user, post=post).exists()
-        return False
+        return get_my_reactions(self.context, [post]).get(post.pk, False)
+
+
+class PostSerializer(HasMyReactionMixin, TaggitSerializer, serializers.ModelSerializer):
+    topics = TagListSerializerField()
+    author = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    author_profile = ProfileField(source="author_id")
+    cover_image = CoverImageField(required=False, allow_null=True)
+    cover_variants = CoverVariantsField()
 
     class Meta:
         model = models.Post
+        list_serializer_class = ReactionAwareListSerializer
         fields = [
             "topics",
             "title",
             "slug",
             "description",
             "short_description",
+            "excerpt",
+            "word_count",
             "publish_at",
             "cover_image",
+            "cover_width",
+            "cover_height",
+            "cover_placeholder",
+            "cover_variants",
             "author",
             "author_profile",
             "total_comment",
@@ -56,26 +136,68 @@ class PostSerializer(TaggitSerializer, serializers.ModelSerializer):
         return super().validate(attrs)
 
 
-class PostListSerializer(TaggitSerializer, serializers.ModelSerializer):
-    author_profile = UserMinimalSerializer(read_only=True, source="author")
+class PostListSerializer(
+    HasMyReactionMixin, TaggitSerializer, serializers.ModelSerializer
+):
+    author_profile = ProfileField(source="author_id")
+    cover_variants = CoverVariantsField()
 
     class Meta:
         model = models.Post
+        list_serializer_class = ReactionAwareListSerializer
         fields = [
             "title",
             "short_description",
+            "excerpt",
+            "word_count",
             "slug",
+            "cover_width",
+            "cover_height",
+            "cover_placeholder",
+            "cover_variants",
             "author_profile",
             "total_comment",
             "total_reaction",
+            "has_my_reaction",
         ]
 
 
+class ReactionBatchSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.SlugField(max_length=255),
+        default=list,
+        max_length=reactions.BATCH_LIMIT,
+    )
+    remove = serializers.ListField(
+        child=serializers.SlugField(max_length=255),
+        default=list,
+        max_length=reactions.BATCH_LIMIT,
+    )
+
+    def validate(self, attrs):
+        if not attrs["add"] and not attrs["remove"]:
+            raise serializers.ValidationError(_("No reaction to add or remove"))
+        if set(attrs["add"]) & set(attrs["remove"]):
+            raise serializers.ValidationError(
+                _("A post can't be both in add and remove")
+            )
+        return attrs
+
+
+class TopicSerializer(serializers.ModelSerializer):
+    total_post = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Tag
+        fields = ["name", "slug", "total_post"]
+
+
 class ReplySerializer(serializers.ModelSerializer):
-    user_profile = UserMinimalSerializer(read_only=True, source="user")
+    user_profile = ProfileField(source="user_id")
 
     class Meta:
         model = models.Comment
+        list_serializer_class = ProfileListSerializer
         fields = [
             "id",
             "description",
@@ -88,11 +210,12 @@ class ReplySerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    user_profile = UserMinimalSerializer(read_only=True, source="user")
+    user_profile = ProfileField(source="user_id")
     replies = ReplySerializer(many=True, read_only=True)
 
     class Meta:
         model = models.Comment
+        list_serializer_class = ProfileListSerializer
         fields = [
             "id",
             "description",
@@ -100,10 +223,14 @@ class CommentSerializer(serializers.ModelSerializer):
             "user",
             "user_profile",
             "replies",
+            "total_reply",
+            "last_reply_at",
         ]
         extra_kwargs = {
             "id": {"read_only": True},
             "parent": {"write_only": True},
+            "total_reply": {"read_only": True},
+            "last_reply_at": {"read_only": True},
         }
 
     def validate(self, attrs):
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent with `instance` once a post becomes public, after the commit
+post_published = Signal()
@@ -1,13 +1,31 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
 from datetime import timedelta
 from typing import Any
+from unittest import mock
 
+from asgiref.sync import sync_to_async
+from base.middleware import QueryBudgetExceeded
+from base.testing import QueryBudgetTestCase
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from user.authentication import add_user_claims
+from user.profiles import profile_cache
 
-from . import models
+from . import counters, models, publishing, ranking, search, uploads, views
+from .cache import post_cache
 
 User = get_user_model()
 
@@ -28,9 +46,10 @@ POST_DATA = {
 COMMENT_DATA = {"description": "Comment Content"}
 
 
-class PostTestCase(TestCase):
+class PostTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.base_user = User.objects.create_user(**USER_DATA)  # type: ignore
+        post_cache.cache.clear()
 
         self.post_url = "/api/v1/posts/"
         self.client: Any = APIClient()
@@ -50,6 +69,394 @@ class PostTestCase(TestCase):
         response = self.client.get(self.post_url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_posts_cursor_pagination(self):
+        posts = [self.create_post() for _ in range(5)]
+        expected = [post.slug for post in reversed(posts)]
+
+        slugs = []
+        url = f"{self.post_url}?limit=2&with_total=true"
+        while url:
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            res_data = response.json()
+            self.assertIn("count", res_data)
+            slugs += [post["slug"] for post in res_data["results"]]
+            last_page, url = res_data, res_data["next"]
+        self.assertEqual(slugs, expected)
+
+        response = self.client.get(last_page["previous"], format="json")
+        res_data = response.json()
+        self.assertEqual([post["slug"] for post in res_data["results"]], expected[2:4])
+
+        response = self.client.get(f"{self.post_url}?cursor=invalid", format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_posts_has_my_reaction(self):
+        posts = [self.create_post() for _ in range(3)]
+        for post in posts[:2]:
+            models.Reaction.objects.create(user=self.base_user, post=post)
+
+        self.client.force_authenticate(user=self.base_user)
+        profile_cache.clear()
+        with CaptureQueriesContext(connection) as single_post_queries:
+            self.client.get(f"{self.post_url}?limit=1", format="json")
+        profile_cache.clear()
+        with CaptureQueriesContext(connection) as all_post_queries:
+            response = self.client.get(self.post_url, format="json")
+        self.assertEqual(len(single_post_queries), len(all_post_queries))
+
+        reactions = {
+            post["slug"]: post["has_my_reaction"] for post in response.json()["results"]
+        }
+        self.assertEqual(reactions, {post.slug: post in posts[:2] for post in posts})
+
+    def test_get_posts_without_description(self):
+        post = self.create_post()
+        self.assertEqual(post.word_count, 12)
+        self.assertTrue(post.excerpt.startswith("Long Description, Long"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"{self.post_url}?ordering=trending")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"][0]["excerpt"], post.excerpt)
+        post_queries = [
+            query["sql"] for query in queries if 'FROM "post_post"' in query["sql"]
+        ]
+        self.assertEqual(len(post_queries), 1)
+        self.assertIn('"post_post"."excerpt"', post_queries[0])
+        self.assertNotIn('"post_post"."description"', post_queries[0])
+
+    def test_get_posts_response_cache(self):
+        post = self.create_post()
+        detail_url = f"{self.post_url}{post.slug}/"
+
+        for url in [self.post_url, detail_url]:
+            miss_response = self.client.get(url, format="json")
+            self.assertEqual(miss_response["X-Cache"], "MISS")
+            hit_response = self.client.get(url, format="json")
+            self.assertEqual(hit_response["X-Cache"], "HIT")
+            self.assertEqual(hit_response.json(), miss_response.json())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Comment.objects.create(
+                **COMMENT_DATA, post=post, user=self.base_user
+            )
+        for url in [self.post_url, detail_url]:
+            response = self.client.get(url, format="json")
+            self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["total_comment"], 1)
+
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.get(detail_url, format="json")
+        self.assertNotIn("X-Cache", response)
+
+    def test_get_posts_conditional(self):
+        post = self.create_post()
+        detail_url = f"{self.post_url}{post.slug}/"
+
+        etags = {}
+        for url in [self.post_url, detail_url]:
+            response = self.client.get(url, format="json")
+            etags[url] = response["ETag"]
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response["ETag"], etags[url])
+        response = self.client.get(
+            detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        """Counters move the version"""
+        with self.captureOnCommitCallbacks(execute=True):
+            models.Reaction.objects.create(user=self.base_user, post=post)
+        for url in [self.post_url, detail_url]:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response["ETag"], etags[url])
+
+        """The tag depends on the user"""
+        etag = response["ETag"]
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cover_variants(self):
+        def make_cover(name, size):
+            buffer = io.BytesIO()
+            Image.new("RGB", size, "teal").save(buffer, format="JPEG")
+            return SimpleUploadedFile(name, buffer.getvalue(), "image/jpeg")
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        with override_settings(MEDIA_ROOT=media_root.name, POST_IMAGE_MODE="inline"):
+            post = self.create_post()
+            with self.captureOnCommitCallbacks(execute=True):
+                post.cover_image = make_cover("cover.jpg", (1600, 900))
+                post.save()
+            post.refresh_from_db()
+            self.assertEqual((post.cover_width, post.cover_height), (1600, 900))
+            self.assertTrue(post.cover_placeholder.startswith("data:image/jpeg"))
+            self.assertEqual(set(post.cover_variants["webp"]), {"320", "640", "1280"})
+            storage = post.cover_image.storage
+            old_variant = post.cover_variants["webp"]["320"]
+            with storage.open(old_variant) as file:
+                self.assertEqual(Image.open(file).size, (320, 180))
+
+            response = self.client.get(self.post_url, format="json")
+            cover = response.json()["results"][0]
+            self.assertTrue(cover["cover_variants"]["jpeg"]["640"].endswith(".jpeg"))
+            self.assertEqual(cover["cover_placeholder"], post.cover_placeholder)
+
+            """A new cover replaces the variants"""
+            with self.captureOnCommitCallbacks(execute=True):
+                post.cover_image = make_cover("small.jpg", (400, 300))
+                post.save()
+            post.refresh_from_db()
+            self.assertEqual(set(post.cover_variants["jpeg"]), {"320", "400"})
+            self.assertFalse(storage.exists(old_variant))
+
+    def test_upload_cover(self):
+        def upload(content, title="Cover"):
+            payload = {
+                **POST_DATA,
+                "title": title,
+                "publish_at": timezone.now().isoformat(),
+                "topics": json.dumps(POST_DATA["topics"]),
+                "cover_image": SimpleUploadedFile("cover.png", content, "image/png"),
+            }
+            return self.client.post(self.post_url, data=payload, format="multipart")
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), "teal").save(buffer, format="PNG")
+        content = buffer.getvalue()
+
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.client.force_authenticate(user=self.base_user)
+        with override_settings(MEDIA_ROOT=media_root.name, POST_IMAGE_MODE="inline"):
+            """Identical images are stored once, under their digest"""
+            first = upload(content)
+            self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+            with self.captureOnCommitCallbacks(execute=True):
+                second = upload(content, title="Same cover")
+            self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+            digest = hashlib.sha256(content).hexdigest()
+            names = set(
+                models.Post.objects.exclude(cover_image="").values_list(
+                    "cover_image", flat=True
+                )
+            )
+            self.assertEqual(names, {f"posts/{digest[:2]}/{digest}.png"})
+            post = models.Post.objects.get(slug=second.json()["slug"])
+            self.assertEqual((post.cover_width, post.cover_height), (64, 48))
+
+            response = upload(b"<svg></svg>" * 10)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("cover_image", response.json())
+
+            with override_settings(POST_COVER_MAX_DIMENSION=32):
+                response = upload(content)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            with override_settings(POST_COVER_MAX_SIZE=len(content) - 1):
+                response = upload(content)
+                self.assertEqual(
+                    response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+            self.assertEqual(models.Post.objects.exclude(cover_image="").count(), 2)
+
+            """Rejected requests store nothing"""
+            buffer = io.BytesIO()
+            Image.new("RGB", (40, 30), "navy").save(buffer, format="PNG")
+            response = upload(buffer.getvalue(), title="")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+            self.assertFalse(
+                os.path.exists(os.path.join(media_root.name, "posts", digest[:2]))
+            )
+
+            """Headers past HEADER_LIMIT are checked once the upload is complete"""
+            buffer = io.BytesIO()
+            Image.new("RGB", (64, 48), "teal").save(
+                buffer, format="JPEG", icc_profile=os.urandom(uploads.HEADER_LIMIT + 1)
+            )
+            response = upload(buffer.getvalue(), title="Large header")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            with override_settings(POST_COVER_MAX_DIMENSION=32):
+                response = upload(buffer.getvalue())
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_get_posts_async(self):
+        post = await sync_to_async(self.create_post)()
+        post = await models.Post.objects.aget(id=post.id)
+        await sync_to_async(post.topics.set)(["async"])
+        await models.Reaction.objects.acreate(user=self.base_user, post=post)
+        token = AccessToken.for_user(self.base_user)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        response = await self.async_client.get(self.post_url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()["results"][0]["has_my_reaction"])
+
+        # Token with the user claims, its credentials checked without a thread
+        token = add_user_claims(AccessToken.for_user(self.base_user), self.base_user)
+        response = await self.async_client.get(
+            self.post_url, headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertTrue(response.json()["results"][0]["has_my_reaction"])
+        await sync_to_async(self.base_user.set_password)("changepassword")
+        await self.base_user.asave()
+        response = await self.async_client.get(
+            self.post_url, headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        detail_url = f"{self.post_url}{post.slug}/"
+        response = await self.async_client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["topics"], ["async"])
+        response = await self.async_client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = await self.async_client.get(
+            detail_url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await self.async_client.get(f"{self.post_url}unknown-post/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_activity_on_unpublished_posts(self):
+        draft = models.Post(**{**POST_DATA, "publish_at": None}, author=self.base_user)
+        draft.save()
+        scheduled = models.Post(
+            **{**POST_DATA, "publish_at": timezone.now() + timedelta(hours=1)},
+            author=self.base_user,
+        )
+        scheduled.save()
+        self.assertEqual((draft.trending_score, scheduled.trending_score), (0, 0))
+
+        """Adding and removing activity on a score of 0 stays in range"""
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.post(f"{self.post_url}{draft.slug}/reactions/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        comment = models.Comment.objects.create(
+            **COMMENT_DATA, post=scheduled, user=self.base_user
+        )
+        comment.delete()
+        response = self.client.delete(f"{self.post_url}{draft.slug}/reactions/remove/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        """Once published the publish term outweighs what the removals left"""
+        draft.refresh_from_db()
+        draft.publish_at = timezone.now()
+        draft.save()
+        publishing.publish_due_posts(now=scheduled.publish_at)
+        scores = dict(models.Post.objects.values_list("id", "trending_score"))
+        ranking.rebuild_scores()
+        for post_id, score in models.Post.objects.values_list("id", "trending_score"):
+            self.assertAlmostEqual(score, scores[post_id], places=6)
+
+    def test_get_posts_ranking(self):
+        old, commented, reacted, quiet = [self.create_post() for _ in range(4)]
+        readers = [
+            User.objects.create_user(username=f"reader{i}", password="password")
+            for i in range(3)
+        ]
+        models.Comment.objects.create(**COMMENT_DATA, post=commented, user=readers[0])
+        models.Reaction.objects.create(user=readers[0], post=reacted)
+        for reader in readers:
+            models.Reaction.objects.create(user=reader, post=old)
+        models.Reaction.objects.create(user=readers[1], post=quiet).delete()
+
+        scores = dict(models.Post.objects.values_list("id", "trending_score"))
+        ranking.rebuild_scores()
+        for post_id, score in models.Post.objects.values_list("id", "trending_score"):
+            self.assertAlmostEqual(score, scores[post_id])
+
+        # Move the most reacted post's activity ten days back
+        ten_days_ago = timezone.now() - timedelta(days=10)
+        models.Post.objects.filter(id=old.id).update(publish_at=ten_days_ago)  # type: ignore
+        models.Reaction.objects.filter(post=old).update(created_at=ten_days_ago)
+        ranking.rebuild_scores()
+
+        def ranked(ordering):
+            response = self.client.get(f"{self.post_url}?ordering={ordering}")
+            return [post["slug"] for post in response.json()["results"]]
+
+        self.assertEqual(
+            ranked("trending"), [commented.slug, reacted.slug, quiet.slug, old.slug]
+        )
+        self.assertEqual(
+            ranked("top_all"), [old.slug, commented.slug, reacted.slug, quiet.slug]
+        )
+        self.assertEqual(ranked("top_week"), [commented.slug, reacted.slug, quiet.slug])
+
+    def test_search_posts(self):
+        django_post = models.Post.objects.get(id=self.create_post().id)  # type: ignore
+        django_post.title = "Scaling Django"
+        django_post.save()
+        django_post.topics.add("python")
+        topic_post = models.Post.objects.get(id=self.create_post().id)  # type: ignore
+        topic_post.topics.add("django")
+        self.create_post()
+
+        response = self.client.get(f"{self.post_url}?q=djan", format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        slugs = [post["slug"] for post in response.json()["results"]]
+        self.assertCountEqual(slugs, [django_post.slug, topic_post.slug])
+
+        response = self.client.get(f"{self.post_url}?q=djan&limit=1", format="json")
+        first_page = response.json()
+        response = self.client.get(first_page["next"], format="json")
+        self.assertCountEqual(
+            [first_page["results"][0]["slug"], response.json()["results"][0]["slug"]],
+            slugs,
+        )
+
+        response = self.client.get(f"{self.post_url}?q=django python", format="json")
+        slugs = [post["slug"] for post in response.json()["results"]]
+        self.assertEqual(slugs, [django_post.slug])
+
+        ranked = search.InvertedIndex.from_queryset(models.Post.objects.all())
+        self.assertEqual(set(ranked.search("djan")), {django_post.id, topic_post.id})  # type: ignore
+
+    def test_filter_posts_by_topics(self):
+        python_post, django_post, both_post = [
+            models.Post.objects.get(id=self.create_post().id)  # type: ignore
+            for _ in range(3)
+        ]
+        python_post.topics.set(["Python"])
+        django_post.topics.set(["django"])
+        both_post.topics.set(["Python", "django"])
+        self.create_post()
+
+        def slugs(query):
+            response = self.client.get(f"{self.post_url}?{query}", format="json")
+            return {post["slug"] for post in response.json()["results"]}
+
+        self.assertEqual(
+            slugs("topics=python,django"),
+            {python_post.slug, django_post.slug, both_post.slug},
+        )
+        self.assertEqual(slugs("topics_all=Python,django"), {both_post.slug})
+        # The name and the slug of one topic count once
+        self.assertEqual(
+            slugs("topics_all=Python,python"), {python_post.slug, both_post.slug}
+        )
+        self.assertEqual(slugs("topics_all=python,unknown"), set())
+        self.assertEqual(slugs("tags=django"), {django_post.slug, both_post.slug})
+
+        response = self.client.get("/api/v1/topics/", format="json")
+        self.assertEqual(response["X-Cache"], "MISS")
+        topics = [(t["slug"], t["total_post"]) for t in response.json()["results"]]
+        self.assertCountEqual(topics, [("django", 2), ("python", 2)])
+        response = self.client.get("/api/v1/topics/", format="json")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.get("/api/v1/topics/", format="json")
+        self.assertEqual(response["X-Cache"], "HIT")
+
     def test_get_user_posts(self):
         self.client.force_authenticate(user=self.base_user)
         response = self.client.get(
@@ -82,6 +489,55 @@ class PostTestCase(TestCase):
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_publish_scheduled_post(self):
+        post = self.create_post()
+        post.publish_at = timezone.now() + timedelta(hours=1)
+        post.save()
+        self.assertFalse(post.is_published)
+
+        response = self.client.get(self.post_url, format="json")
+        self.assertEqual(response.json()["results"], [])
+        self.assertEqual(publishing.next_publish_at(), post.publish_at)
+
+        self.assertEqual(publishing.publish_due_posts(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            published = publishing.publish_due_posts(now=post.publish_at)
+        self.assertEqual([p.pk for p in published], [post.pk])
+        self.assertIsNone(publishing.next_publish_at())
+
+        response = self.client.get(self.post_url, format="json")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["slug"], post.slug)
+
+    def test_publish_post_saved_scheduled(self):
+        publish_at = timezone.now() + timedelta(hours=1)
+        post = models.Post(
+            **{**POST_DATA, "publish_at": publish_at}, author=self.base_user
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertFalse(post.is_published)
+        self.assertEqual(publishing.next_publish_at(), publish_at)
+
+        response = self.client.get(self.post_url, format="json")
+        self.assertEqual(response.json()["results"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            published = publishing.publish_due_posts(now=publish_at)
+        self.assertEqual([p.pk for p in published], [post.pk])
+        post.refresh_from_db()
+        self.assertGreater(post.trending_score, 0)
+
+        response = self.client.get(self.post_url, format="json")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["slug"], post.slug)
+
+    def test_publish_posts_needs_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, "RESPONSE_CACHE_URL"):
+            call_command("publish_posts", "--loop")
+        with self.assertRaisesMessage(CommandError, "RESPONSE_CACHE_URL"):
+            call_command("publish_posts")
+
     def test_update_post(self):
         post = self.create_post()
         url = f"{self.post_url}{post.slug}/"
@@ -104,8 +560,21 @@ class PostTestCase(TestCase):
         response = self.client.delete(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_post_owner_with_token(self):
+        post = models.Post(**{**POST_DATA, "publish_at": None}, author=self.base_user)
+        post.save()
+        url = f"{self.post_url}{post.slug}/"
 
-class CommentTestCase(TestCase):
+        self.login(self.client, USER_DATA["username"], USER_DATA["password"])
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(url, data={"title": "Changed"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class CommentTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.base_user = User.objects.create_user(**USER_DATA)  # type: ignore
 
@@ -139,6 +608,70 @@ class CommentTestCase(TestCase):
         response = self.client.get(self.comment_url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_get_post_comments_conditional(self):
+        reply = self.create_reply()
+        response = self.client.get(self.comment_url, format="json")
+        etag = response["ETag"]
+        response = self.client.get(self.comment_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        """Editing a reply shown in the list moves its parent"""
+        reply.description = "Edited"
+        reply.save()
+        response = self.client.get(self.comment_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["results"][0]["replies"][0]["description"], "Edited"
+        )
+
+    def test_get_post_comments_query_budget(self):
+        for _ in range(3):
+            self.create_reply()
+        response = self.client.get(self.comment_url, format="json")
+        self.assertEqual(len(response.json()["results"]), 3)
+        self.assertNoDuplicateQueries(response)
+
+        with self.settings(QUERY_BUDGET_STRICT=False):
+            with mock.patch.object(views.CommentViewSet, "query_budget", {"list": 1}):
+                response = self.client.get(self.comment_url, format="json")
+        self.assertEqual(response["X-DB-Query-Budget"], "1")
+        with mock.patch.object(views.CommentViewSet, "query_budget", {"list": 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.comment_url, format="json")
+
+    def test_get_post_comment_replies(self):
+        comment = self.create_comment()
+        replies = [
+            models.Comment.objects.create(
+                **COMMENT_DATA, post=self.post, user=self.base_user, parent=comment
+            )
+            for _ in range(5)
+        ]
+        self.create_comment()
+
+        with self.settings(COMMENT_REPLY_PREVIEW=2):
+            response = self.client.get(self.comment_url, format="json")
+        results = {result["id"]: result for result in response.json()["results"]}
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[comment.id]["total_reply"], 5)  # type: ignore
+        self.assertEqual(
+            [reply["id"] for reply in results[comment.id]["replies"]],  # type: ignore
+            [reply.id for reply in replies[:2]],  # type: ignore
+        )
+
+        ids = []
+        url = f"{self.comment_url}{comment.id}/replies/?limit=2"  # type: ignore
+        while url:
+            response = self.client.get(url, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [reply["id"] for reply in response.json()["results"]]
+            url = response.json()["next"]
+        self.assertEqual(ids, [reply.id for reply in replies])  # type: ignore
+
+        url = f"{self.comment_url}{replies[0].id}/replies/"  # type: ignore
+        response = self.client.get(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_update_comment(self):
         comment = self.create_comment()
         url = f"{self.comment_url}{comment.id}/"  # type: ignore
@@ -163,6 +696,16 @@ class CommentTestCase(TestCase):
         response = self.client.delete(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_comment_owner_with_token(self):
+        comment = self.create_comment()
+        url = f"{self.comment_url}{comment.id}/"  # type: ignore
+
+        self.login(self.client, USER_DATA["username"], USER_DATA["password"])
+        response = self.client.patch(url, data={"description": "New"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
     def test_create_reply(self):
         comment = self.create_comment()
         payload = {**COMMENT_DATA, "parent": comment.id}  # type: ignore
@@ -187,6 +730,60 @@ class CommentTestCase(TestCase):
         reply.refresh_from_db()
         self.assertEqual(reply.description, updated_description)
 
+    def test_comment_counter(self):
+        reply = self.create_reply()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_comment, 2)
+
+        reply.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_comment, 1)
+
+        models.Post.objects.filter(id=self.post.id).update(total_comment=10)  # type: ignore
+        self.post.refresh_counts()
+        self.assertEqual(self.post.total_comment, 1)
+
+    def test_reply_counter(self):
+        reply = self.create_reply()
+        comment = reply.parent
+        busy_comment = self.create_reply().parent
+        last_reply = models.Comment.objects.create(
+            **COMMENT_DATA, post=self.post, user=self.base_user, parent=busy_comment
+        )
+        busy_comment.refresh_from_db()
+        self.assertEqual(busy_comment.total_reply, 2)
+        self.assertEqual(busy_comment.last_reply_at, last_reply.created_at)
+
+        response = self.client.get(f"{self.comment_url}?ordering=active", format="json")
+        self.assertEqual(
+            [result["id"] for result in response.json()["results"]],
+            [busy_comment.id, comment.id],  # type: ignore
+        )
+
+        last_reply.delete()
+        busy_comment.refresh_from_db()
+        self.assertEqual(busy_comment.total_reply, 1)
+        self.assertLess(busy_comment.last_reply_at, last_reply.created_at)
+
+        models.Comment.objects.update(total_reply=10, last_reply_at=None)
+        counters.rebuild_reply_counts()
+        comment.refresh_from_db()
+        self.assertEqual(comment.total_reply, 1)
+        self.assertEqual(comment.last_reply_at, reply.created_at)
+
+    def test_buffered_comment_counter(self):
+        counter = counters.BufferedCounter()
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                counter.add(self.post.id, "total_comment", 1)  # type: ignore
+            counter.add(self.post.id, "total_comment", -1)  # type: ignore
+        self.assertEqual(dict(counter.deltas), {(self.post.id, "total_comment"): 2})  # type: ignore
+
+        counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_comment, 2)
+        self.assertEqual(dict(counter.deltas), {})
+
     def test_delete_reply(self):
         reply = self.create_reply()
         url = f"{self.comment_url}{reply.id}/"  # type: ignore
@@ -196,7 +793,7 @@ class CommentTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
 
-class ReactionTestCase(TestCase):
+class ReactionTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.base_user = User.objects.create_user(**USER_DATA)  # type: ignore
 
@@ -211,6 +808,85 @@ class ReactionTestCase(TestCase):
         self.client.force_authenticate(user=self.base_user)
         response = self.client.post(self.reaction_url, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_reaction, 1)
+        self.assertEqual(self.post.total_comment, 0)
+
+        response = self.client.post(self.reaction_url, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_reaction, 1)
+
+    def test_batch_post_reactions(self):
+        other = models.Post(**{**POST_DATA, "title": "Other"}, author=self.base_user)
+        other.save()
+        url = "/api/v1/reactions/"
+        payload = {"add": [self.post.slug, other.slug, "unknown"]}
+
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        res_data = response.json()
+        self.assertEqual(res_data["added"], sorted([self.post.slug, other.slug]))
+        self.assertEqual(res_data["missing"], ["unknown"])
+
+        """Adding again is a no-op"""
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.json()["added"], [])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.total_reaction, 1)
+
+        payload = {"add": [self.post.slug], "remove": [other.slug]}
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.json()["removed"], [other.slug])
+        other.refresh_from_db()
+        self.assertEqual(other.total_reaction, 0)
+        self.assertFalse(models.Reaction.objects.filter(post=other).exists())
+
+        payload = {"add": [self.post.slug], "remove": [self.post.slug]}
+        response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_post_reactions_queries(self):
+        posts = [
+            models.Post(**{**POST_DATA, "title": f"Post {i}"}, author=self.base_user)
+            for i in range(12)
+        ]
+        for post in posts:
+            post.save()
+        for post in posts[10:]:
+            models.Reaction.objects.create(user=self.base_user, post=post)
+        url = "/api/v1/reactions/"
+        payload = {
+            "add": [post.slug for post in posts[:10]],
+            "remove": [post.slug for post in posts[10:]],
+        }
+
+        self.client.force_authenticate(user=self.base_user)
+        # The insert, the delete and one UPDATE of the counters
+        with self.assertNumQueries(3):
+            response = self.client.post(url, data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["added"]), 10)
+        self.assertEqual(len(response.json()["removed"]), 2)
+
+        post_ids = [post.pk for post in posts]
+        scores = dict(
+            models.Post.objects.filter(pk__in=post_ids).values_list(
+                "pk", "total_reaction"
+            )
+        )
+        self.assertEqual(scores, {post.pk: int(post in posts[:10]) for post in posts})
+        trending = dict(
+            models.Post.objects.filter(pk__in=post_ids).values_list(
+                "pk", "trending_score"
+            )
+        )
+        ranking.rebuild_scores(post_ids)
+        for pk, score in models.Post.objects.filter(pk__in=post_ids).values_list(
+            "pk", "trending_score"
+        ):
+            self.assertAlmostEqual(trending[pk], score, places=6)
 
     def test_delete_post_reaction(self):
         url = f"{self.reaction_url}remove/"
@@ -0,0 +1,181 @@
+"""
+Streaming cover uploads.
+
+`CoverUploadHandler` takes the `cover_image` part of multipart requests
+before Django's default handlers. The part is checked while it streams in:
+the format from the magic bytes of the first chunk, the dimensions as soon
+as Pillow has parsed the header, and the size on every chunk, so a bad
+upload is rejected without reading the rest. Chunks are hashed and spooled
+to a temporary file, never held in memory as a whole.
+
+The request gets a verified `CoverUpload`, still in its temporary file, which
+is removed with the request unless the post is saved: only then does
+`store_cover` put it in storage under its SHA-256 (`posts/ab/abcd....jpg`), so
+rejected requests leave nothing behind, identical images are stored once and
+every post using them shares the file.
+
+Limits come from POST_COVER_MAX_SIZE (bytes) and POST_COVER_MAX_DIMENSION
+(pixels per side).
+"""
+import hashlib
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import uploadhandler
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageFile
+from rest_framework import exceptions, status
+
+UPLOAD_DIR = "posts"
+FIELD_NAME = "cover_image"
+# Bytes fed to Pillow for the dimensions while streaming; images with larger
+# headers (e.g. big EXIF or ICC blocks) get them checked once complete
+HEADER_LIMIT = 1024 * 1024
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+
+class CoverTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = _("The cover image is too large.")
+    default_code = "cover_too_large"
+
+
+def get_max_size():
+    return getattr(settings, "POST_COVER_MAX_SIZE", 10 * 1024 * 1024)
+
+
+def get_max_dimension():
+    return getattr(settings, "POST_COVER_MAX_DIMENSION", 8000)
+
+
+def detect_format(header):
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    return None
+
+
+def invalid(message):
+    return exceptions.ValidationError({FIELD_NAME: [message]})
+
+
+def check_dimensions(size):
+    if max(size) > get_max_dimension():
+        raise invalid(
+            _("The cover image can't be larger than %(size)s pixels.")
+            % {"size": get_max_dimension()}
+        )
+
+
+def get_storage():
+    return apps.get_model("post", "Post")._meta.get_field(FIELD_NAME).storage
+
+
+class CoverUpload(TemporaryUploadedFile):
+    """A verified cover in its temporary file, `digest` being its SHA-256."""
+
+    digest = None
+    format = None
+
+    @property
+    def storage_name(self):
+        return f"{UPLOAD_DIR}/{self.digest[:2]}/{self.digest}{EXTENSIONS[self.format]}"
+
+
+def store_cover(cover):
+    """Store `cover` under its content address unless there, return the name."""
+    storage = get_storage()
+    name = cover.storage_name
+    if storage.exists(name):
+        return name
+    cover.seek(0)
+    # A concurrent upload of the same image may get a suffixed copy
+    return storage.save(name, cover)
+
+
+def store_covers(validated_data):
+    """Swap a `CoverUpload` of serializer data for its stored name."""
+    cover = validated_data.get(FIELD_NAME)
+    if isinstance(cover, CoverUpload):
+        validated_data[FIELD_NAME] = store_cover(cover)
+
+
+class CoverUploadHandler(uploadhandler.FileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        self.active = field_name == FIELD_NAME
+        if not self.active:
+            return
+        self.file = CoverUpload(file_name, content_type, 0, None)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.checked = False
+        self.parser = ImageFile.Parser()
+        raise uploadhandler.StopFutureHandlers()
+
+    def abort(self, exc):
+        self.file.close()
+        raise exc
+
+    def check_header(self, raw_data):
+        """Check the format on the first chunk, the dimensions once parsed."""
+        if self.file.format is None:
+            self.file.format = detect_format(raw_data[:12])
+            if self.file.format is None:
+                self.abort(invalid(_("Upload a JPEG, PNG, WebP or GIF image.")))
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            self.abort(invalid(_("The cover image is corrupted.")))
+        if self.parser.image is not None:
+            try:
+                check_dimensions(self.parser.image.size)
+            except exceptions.ValidationError as exc:
+                self.abort(exc)
+            self.checked = True
+            self.parser = None
+        elif self.size > HEADER_LIMIT:
+            # Stop buffering in the parser, file_complete checks the rest
+            self.parser = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        self.size += len(raw_data)
+        if self.size > get_max_size():
+            self.abort(CoverTooLarge())
+        if self.parser is not None:
+            self.check_header(raw_data)
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.file.seek(0)
+        try:
+            with Image.open(self.file) as image:
+                if not self.checked:
+                    check_dimensions(image.size)
+                image.verify()
+        except exceptions.ValidationError as exc:
+            self.abort(exc)
+        except Exception:
+            self.abort(invalid(_("The cover image is corrupted.")))
+
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.digest = self.digest.hexdigest()
+        return self.file
+
+
+def add_cover_handler(request):
+    """Put `CoverUploadHandler` first, before the request body is read."""
+    request.upload_handlers.insert(0, CoverUploadHandler(request))
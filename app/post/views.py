@@ -1,30 +1,81 @@
-from base.paginations import DefaultPagination
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from base import paginations
+from base.async_views import AsyncReadMixin
+from base.cache import CachedResponseMixin
+from base.columns import SerializerColumnsMixin
+from base.conditional import ConditionalListMixin, ConditionalResponseMixin
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters import rest_framework as filters
-from rest_framework import filters as drf_filters
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
+from taggit.models import Tag
+from user.profiles import aget_profiles
+from user.serializers import collect_user_ids
 
-from . import models, serializers
+from . import models, ranking, reactions, search, serializers, uploads
+from .cache import post_cache, topic_cache
 
 User = get_user_model()
 
+# ?ordering= values of the post list, read from the scores of post.ranking
+RANKED_ORDERINGS = {
+    "trending": ("-trending_score", "-id"),
+    "top_week": ("-top_score", "-id"),
+    "top_all": ("-top_score", "-id"),
+}
+
+
+class TopicsFilter(filters.CharFilter):
+    """
+    Comma separated topic names or slugs. Matches posts with any of them, or
+    with all of them when `match_all` is set, through a semi-join on PostTopic
+    so the posts need no DISTINCT.
+    """
+
+    def __init__(self, *args, match_all=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.match_all = match_all
 
-class TagsFilter(filters.CharFilter):
     def filter(self, qs, value):
-        if value:
-            tags = [tag.strip() for tag in value.split(",")]
-            qs = qs.filter(tags__name__in=tags).distinct()
+        topics = {topic.strip() for topic in (value or "").split(",")} - {""}
+        if not topics:
+            return qs
+        if self.match_all:
+            return self.filter_all(qs, topics)
+        items = models.PostTopic.objects.filter(
+            Q(tag__name__in=topics) | Q(tag__slug__in=topics)
+        ).values("content_object")
+        return qs.filter(id__in=items)
+
+    def filter_all(self, qs, topics):
+        # One semi-join per topic, so a name and a slug of the same topic
+        # match the same row instead of counting twice
+        for topic in sorted(topics):
+            items = models.PostTopic.objects.filter(
+                Q(tag__name=topic) | Q(tag__slug=topic),
+                content_object=OuterRef("pk"),
+            )
+            qs = qs.filter(Exists(items))
         return qs
 
 
 class PostFilter(filters.FilterSet):
-    tags = TagsFilter(field_name="tags__name")
-    title = filters.CharFilter(lookup_expr="icontains")
+    topics = TopicsFilter()
+    topics_all = TopicsFilter(match_all=True)
+    # Same as topics, kept for older clients
+    tags = TopicsFilter()
+    q = filters.CharFilter(method="filter_search")
+    title = filters.CharFilter(method="filter_search")
     created_from = filters.CharFilter(field_name="created_at", lookup_expr="gte")
     created_to = filters.CharFilter(field_name="created_at", lookup_expr="lte")
     author__username = filters.CharFilter(
@@ -33,40 +84,107 @@ class PostFilter(filters.FilterSet):
 
     class Meta:
         model = models.Post
-        fields = ["tags", "title", "created_from", "created_to", "author__username"]
+        fields = [
+            "topics",
+            "topics_all",
+            "tags",
+            "q",
+            "title",
+            "created_from",
+            "created_to",
+            "author__username",
+        ]
+
+    def filter_search(self, queryset, name, value):
+        return search.search_posts(queryset, value)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(
+    ConditionalResponseMixin,
+    CachedResponseMixin,
+    AsyncReadMixin,
+    SerializerColumnsMixin,
+    viewsets.ModelViewSet,
+):
     lookup_field = "slug"
     queryset = models.Post.objects.none()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     serializer_class = serializers.PostSerializer
-    pagination_class = DefaultPagination
+    pagination_class = paginations.FeedKeysetPagination
+    response_cache = post_cache
+    query_budget = {"list": 4, "retrieve": 5}
 
     filterset_class = PostFilter
-    search_fields = ("title",)
-    filter_backends = [filters.DjangoFilterBackend, drf_filters.SearchFilter]
+    filter_backends = [filters.DjangoFilterBackend]
 
-    def get_queryset(self):
+    def is_own_posts_request(self):
         user = self.request.user
-        if (
+        return bool(
             user
             and user.is_authenticated
             and user.username == self.request.query_params.get("author__username")  # type: ignore
-        ):
+        )
+
+    def get_queryset(self):
+        user = self.request.user
+        if self.is_own_posts_request():
             queryset = models.Post.objects.filter(author=user)
         else:
-            queryset = models.Post.objects.filter(publish_at__lt=timezone.now())
-        return queryset.select_related("author").order_by("-id")
+            queryset = models.Post.objects.filter(is_published=True)
+        if self.get_ranking() == "top_week":
+            since = timezone.now() - timedelta(days=ranking.TOP_WEEK_DAYS)
+            queryset = queryset.filter(publish_at__gte=since)
+        return queryset.order_by("-id")
+
+    def get_ranking(self):
+        ordering = self.request.query_params.get("ordering")
+        return ordering if ordering in RANKED_ORDERINGS else None
+
+    def get_keyset_ordering(self):
+        params = self.request.query_params
+        if self.action == "list" and (params.get("q") or params.get("title")):
+            return (f"-{search.RANK_FIELD}", "-id")
+        if self.get_ranking():
+            return RANKED_ORDERINGS[self.get_ranking()]
+        if self.is_own_posts_request():
+            # Drafts have no publish_at, so the author's own list is keyed on id
+            return ("-id",)
+        return ("-publish_at", "-id")
+
+    def initialize_request(self, request, *args, **kwargs):
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action in ("create", "update", "partial_update"):
+            # Before authentication, whose CSRF check may read the body
+            uploads.add_cover_handler(request._request)
+        return request
+
+    def perform_create(self, serializer):
+        # Covers reach storage only once the request is valid and allowed
+        uploads.store_covers(serializer.validated_data)
+        super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        uploads.store_covers(serializer.validated_data)
+        super().perform_update(serializer)
 
     def get_object(self):
         slug = self.kwargs[self.lookup_field]
         post = get_object_or_404(models.Post, slug=slug)
-        if (
-            self.action == "retrieve"
-            and post.publish_at
-            and post.publish_at < timezone.now()
-        ):
+        return self.check_post_access(post)
+
+    async def aget_object(self):
+        slug = self.kwargs[self.lookup_field]
+        post = (
+            await models.Post.objects.prefetch_related("topics")
+            .filter(slug=slug)
+            .afirst()
+        )
+        if post is None:
+            raise Http404
+        return self.check_post_access(post)
+
+    def check_post_access(self, post):
+        if self.action == "retrieve" and post.is_published:
             return post
         if not self.request.user:
             raise PermissionDenied("Invalid access")
@@ -74,6 +192,28 @@ class PostViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You don't have permission")
         return post
 
+    async def afilter_queryset(self, queryset):
+        if search.uses_postgres(queryset):
+            return self.filter_queryset(queryset)
+        # The in-memory search fallback reads rows while filtering
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def aprepare_objects(self, posts):
+        self.my_reactions = await serializers.aget_my_reactions(
+            self.request.user, posts
+        )
+        self.profiles = await aget_profiles(
+            collect_user_ids(self.get_serializer(), posts)
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if hasattr(self, "my_reactions"):
+            context["my_reactions"] = self.my_reactions
+        if hasattr(self, "profiles"):
+            context["profiles"] = self.profiles
+        return context
+
     def get_serializer_class(self):
         return (
             serializers.PostListSerializer
@@ -83,6 +223,8 @@ class PostViewSet(viewsets.ModelViewSet):
 
 
 class CommentViewSet(
+    ConditionalListMixin,
+    AsyncReadMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -93,17 +235,36 @@ class CommentViewSet(
     queryset = models.Comment.objects.none()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     serializer_class = serializers.CommentSerializer
-    pagination_class = DefaultPagination
+    pagination_class = paginations.KeysetPagination
+    query_budget = {"list": 3, "replies": 3}
 
     def get_queryset(self):
         post_slug = self.kwargs.get("slug")
+        # Only the first replies of each comment, fetched in one query with
+        # ROW_NUMBER() over (parent_id); the rest come from `replies`
+        replies = (
+            models.Comment.objects.annotate(
+                position=Window(
+                    RowNumber(), partition_by=[F("parent_id")], order_by=F("id").asc()
+                )
+            )
+            .filter(position__lte=settings.COMMENT_REPLY_PREVIEW)
+            .order_by("id")
+        )
         return (
             models.Comment.objects.filter(post__slug=post_slug, parent=None)  # type: ignore
             .order_by("-id")
-            .select_related("user")
-            .prefetch_related("replies__user")
+            .prefetch_related(Prefetch("replies", queryset=replies))
         )
 
+    def get_keyset_ordering(self):
+        if self.action == "replies":
+            # Replies read oldest first, carrying on from the preview
+            return ("id",)
+        if self.request.query_params.get("ordering") == "active":
+            return ("-total_reply", "-id")
+        return ("-id",)
+
     def get_object(self):
         id = self.kwargs[self.lookup_field]
         if not self.request.user:
@@ -114,11 +275,38 @@ class CommentViewSet(
             raise PermissionDenied("You don't have permission")
         return comment
 
+    async def aprepare_objects(self, comments):
+        self.profiles = await aget_profiles(
+            collect_user_ids(self.get_serializer(), comments)
+        )
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["post_slug"] = self.kwargs.get("slug")
+        if hasattr(self, "profiles"):
+            context["profiles"] = self.profiles
         return context
 
+    def get_serializer_class(self):
+        return (
+            serializers.ReplySerializer
+            if self.action == "replies"
+            else serializers.CommentSerializer
+        )
+
+    @action(detail=True, methods=["get"])
+    def replies(self, request, *args, **kwargs):
+        comment = get_object_or_404(
+            models.Comment,
+            id=kwargs[self.lookup_field],
+            post__slug=kwargs.get("slug"),
+            parent=None,
+        )
+        queryset = models.Comment.objects.filter(parent=comment)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class ReactionViewSet(
     mixins.CreateModelMixin,
@@ -127,15 +315,17 @@ class ReactionViewSet(
     lookup_field = "pk"
     queryset = models.Comment.objects.none()
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = DefaultPagination
+    pagination_class = paginations.DefaultPagination
+    query_budget = {"create": 2, "remove": 2}
 
     def create(self, request, *args, **kwargs):
         post_slug = kwargs.get("slug")
-        post = get_object_or_404(models.Post, slug=post_slug)
-        if models.Reaction.objects.filter(user=request.user, post=post).exists():
+        # Looks the post up and inserts with ON CONFLICT DO NOTHING at once
+        added = reactions.add_reactions(request.user, [post_slug])
+        if post_slug not in added:
+            raise Http404
+        if not added[post_slug]:
             raise ValidationError("You already react on this post")
-        reaction = models.Reaction(user=request.user, post=post)
-        reaction.save()
         return Response(
             status=status.HTTP_201_CREATED, data={"message": "Reaction added"}
         )
@@ -143,9 +333,62 @@ class ReactionViewSet(
     @action(detail=False, methods=["delete"])
     def remove(self, request, *args, **kwargs):
         post_slug = kwargs.get("slug")
-        post = get_object_or_404(models.Post, slug=post_slug)
-        models.Reaction.objects.filter(user=request.user, post=post).delete()
+        removed = reactions.remove_reactions(request.user, [post_slug])
+        if not removed and not models.Post.objects.filter(slug=post_slug).exists():
+            raise Http404
 
         return Response(
             status=status.HTTP_204_NO_CONTENT, data={"message": "Reaction removed"}
         )
+
+
+class ReactionBatchViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """Add and remove the reactions of the request user on several posts."""
+
+    queryset = models.Reaction.objects.none()
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = serializers.ReactionBatchSerializer
+    query_budget = {"create": 3}
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add, remove = (
+            serializer.validated_data["add"],
+            serializer.validated_data["remove"],
+        )
+
+        # Counters of both lists move in a single UPDATE
+        added, removed = reactions.update_reactions(request.user, add, remove)
+        return Response(
+            status=status.HTTP_200_OK,
+            data={
+                "added": sorted(slug for slug, created in added.items() if created),
+                "removed": sorted(removed),
+                "missing": sorted(set(add) - added.keys()),
+            },
+        )
+
+
+class TopicViewSet(CachedResponseMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Topics by number of published posts, cached for RESPONSE_CACHE_TIMEOUT for
+    every user since nothing in them is per user.
+    """
+
+    queryset = Tag.objects.none()
+    permission_classes = [permissions.AllowAny]
+    serializer_class = serializers.TopicSerializer
+    pagination_class = paginations.DefaultPagination
+    response_cache = topic_cache
+    cached_actions = ("list",)
+    cache_authenticated = True
+    query_budget = {"list": 2}
+
+    def get_queryset(self):
+        return Tag.objects.annotate(
+            total_post=Count(
+                "post_posttopic_items",
+                filter=Q(post_posttopic_items__content_object__is_published=True),
+            )
+        ).order_by("-total_post", "name")
@@ -0,0 +1,151 @@
+"""
+Stateless JWT authentication.
+
+Tokens carry the user fields in TOKEN_USER_CLAIMS, so `request.user` is built
+from the token instead of being loaded on every request. It is a User holding
+only those fields (plus the id): enough for permissions, ownership checks and
+foreign keys, while views that need the full row load it themselves.
+
+Tokens also carry a fingerprint of the password and of `is_active`. Changing
+the password or (de)activating the account stores the new fingerprint in the
+auth cache (AUTH_CACHE_ALIAS) for the lifetime of a refresh token, and tokens
+with an older one are rejected from then on. The cache has to be shared by
+every process; when it is local to each one, the fingerprint is read from the
+user row on every request instead.
+"""
+from asgiref.sync import sync_to_async
+from base.cache import is_process_local
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+TOKEN_USER_CLAIMS = ("username", "full_name", "is_staff")
+PASSWORD_CLAIM = "pwd"
+
+
+def credentials_fingerprint(user):
+    return fingerprint_of(user.password, user.is_active)
+
+
+def fingerprint_of(password, is_active):
+    value = f"{password}:{is_active}"
+    return salted_hmac("user.authentication", value).hexdigest()[:16]
+
+
+def add_user_claims(token, user):
+    for claim in TOKEN_USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[PASSWORD_CLAIM] = credentials_fingerprint(user)
+    return token
+
+
+def get_auth_cache():
+    return caches[getattr(settings, "AUTH_CACHE_ALIAS", "default")]
+
+
+def get_revocation_key(user_id):
+    return f"auth:credentials:{user_id}"
+
+
+def revoke_tokens(user):
+    """
+    Reject every token of `user` issued before its current password and
+    `is_active`.
+    """
+    lifetime = max(
+        api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME
+    )
+    get_auth_cache().set(
+        get_revocation_key(user.pk),
+        credentials_fingerprint(user),
+        lifetime.total_seconds(),
+    )
+
+
+def get_credentials_query(user_id):
+    User = get_user_model()
+    return User.objects.filter(pk=user_id).values_list("password", "is_active")
+
+
+def user_not_found():
+    return AuthenticationFailed(_("User not found"), code="user_not_found")
+
+
+def get_fingerprint(user_id):
+    """The current fingerprint of the user if revoked, None otherwise."""
+    cache = get_auth_cache()
+    if not is_process_local(cache):
+        return cache.get(get_revocation_key(user_id))
+    credentials = get_credentials_query(user_id).first()
+    if credentials is None:
+        raise user_not_found()
+    return fingerprint_of(*credentials)
+
+
+async def aget_fingerprint(user_id):
+    cache = get_auth_cache()
+    if not is_process_local(cache):
+        return await cache.aget(get_revocation_key(user_id))
+    credentials = await get_credentials_query(user_id).afirst()
+    if credentials is None:
+        raise user_not_found()
+    return fingerprint_of(*credentials)
+
+
+def check_password_claim(token, fingerprint):
+    if fingerprint is not None and token.get(PASSWORD_CLAIM) != fingerprint:
+        raise AuthenticationFailed(
+            _("The token has been revoked."), code="token_revoked"
+        )
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def has_user_claims(self, validated_token):
+        # Tokens issued before the claims were added still hit the database
+        return all(
+            claim in validated_token for claim in (*TOKEN_USER_CLAIMS, PASSWORD_CLAIM)
+        )
+
+    def get_user(self, validated_token):
+        if not self.has_user_claims(validated_token):
+            return super().get_user(validated_token)
+        user = self.get_token_user(validated_token)
+        check_password_claim(validated_token, get_fingerprint(user.pk))
+        return user
+
+    async def aauthenticate(self, request):
+        """Used by AsyncReadMixin, only tokens without the claims need a thread."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        if not self.has_user_claims(validated_token):
+            user = await sync_to_async(super().get_user)(validated_token)
+            return user, validated_token
+        user = self.get_token_user(validated_token)
+        fingerprint = await aget_fingerprint(user.pk)
+        check_password_claim(validated_token, fingerprint)
+        return user, validated_token
+
+    def get_token_user(self, validated_token):
+        User = get_user_model()
+        id_field = User._meta.get_field(api_settings.USER_ID_FIELD)
+        # simplejwt stores the id claim as a string
+        user_id = id_field.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        user = User(
+            **{api_settings.USER_ID_FIELD: user_id},
+            **{claim: validated_token[claim] for claim in TOKEN_USER_CLAIMS},
+        )
+        # Behave like a fetched row for foreign keys and filters
+        user._state.adding = False
+        user._state.db = User.objects.db
+        return user
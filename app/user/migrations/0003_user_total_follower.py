@@ -0,0 +1,17 @@
+# Generated by Django 4.2.10 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0002_index_plan"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="total_follower",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
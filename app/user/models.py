@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
+from .authentication import revoke_tokens
+
 
 class UserManager(BaseUserManager):
     def create_user(
@@ -45,4 +47,33 @@ class UserManager(BaseUserManager):
 
 class User(AbstractUser):
     full_name = models.CharField(_("Full name"), max_length=150, blank=True)
+    total_follower = models.PositiveIntegerField(default=0)
     objects = UserManager()
+
+    # is_active as loaded, None when it wasn't
+    _loaded_is_active = None
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Registration and profile updates check email uniqueness
+            models.Index(fields=["email"], name="user_email_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "is_active" in field_names:
+            instance._loaded_is_active = values[field_names.index("is_active")]
+        return instance
+
+    def save(self, *args, **kwargs):
+        active_changed = (
+            self._loaded_is_active is not None
+            and "is_active" not in self.get_deferred_fields()
+            and self.is_active != self._loaded_is_active
+        )
+        super().save(*args, **kwargs)
+        self._loaded_is_active = self.is_active
+        if active_changed:
+            # Access tokens don't hit the database, see user.authentication
+            transaction.on_commit(lambda: revoke_tokens(self))
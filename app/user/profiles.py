@@ -0,0 +1,108 @@
+"""
+Public author profiles ({"full_name", "username"}) embedded in list responses.
+
+Profiles are kept per process by user id, so serializing a page of posts or
+comments doesn't need the user rows: `ProfileField` reads them from here and
+the ones missing are loaded with a single query per page. An entry lives for
+USER_PROFILE_CACHE_TIMEOUT seconds; UserDetailSerializer.update drops it right
+away in the process that served the change, the other processes catch up when
+it expires.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+PROFILE_FIELDS = ("full_name", "username")
+
+
+class ProfileCache:
+    """Thread-safe LRU of {user_id: profile} with a per-entry timeout."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return getattr(settings, "USER_PROFILE_CACHE_SIZE", 10000)
+
+    @property
+    def timeout(self):
+        return getattr(settings, "USER_PROFILE_CACHE_TIMEOUT", 300)
+
+    def get_many(self, user_ids):
+        now = time.monotonic()
+        profiles = {}
+        with self.lock:
+            for user_id in user_ids:
+                entry = self.entries.get(user_id)
+                if entry is None:
+                    continue
+                expires_at, profile = entry
+                if expires_at < now:
+                    del self.entries[user_id]
+                    continue
+                self.entries.move_to_end(user_id)
+                profiles[user_id] = profile
+        return profiles
+
+    def set_many(self, profiles):
+        expires_at = time.monotonic() + self.timeout
+        with self.lock:
+            for user_id, profile in profiles.items():
+                self.entries[user_id] = (expires_at, profile)
+                self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+profile_cache = ProfileCache()
+
+
+def get_profiles(context, user_ids):
+    """
+    Return {user_id: profile}, resolving every user that is neither in the
+    serializer context nor in the process cache with a single query.
+    """
+    profiles = context.setdefault("profiles", {})
+    missing = {user_id for user_id in user_ids if user_id not in profiles}
+    if missing:
+        profiles.update(profile_cache.get_many(missing))
+        missing -= profiles.keys()
+    if missing:
+        User = get_user_model()
+        fetched = {
+            row.pop("id"): row
+            for row in User.objects.filter(pk__in=missing).values("id", *PROFILE_FIELDS)
+        }
+        profile_cache.set_many(fetched)
+        profiles.update(fetched)
+    return profiles
+
+
+async def aget_profiles(user_ids):
+    """Async `get_profiles`, for priming the context before serializing."""
+    profiles = profile_cache.get_many(set(user_ids))
+    missing = set(user_ids) - profiles.keys()
+    if missing:
+        User = get_user_model()
+        fetched = {
+            row.pop("id"): row
+            async for row in User.objects.filter(pk__in=missing).values(
+                "id", *PROFILE_FIELDS
+            )
+        }
+        profile_cache.set_many(fetched)
+        profiles.update(fetched)
+    return profiles
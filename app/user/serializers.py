@@ -1,9 +1,14 @@
 from typing import Any
 
+from django.db.models import Manager
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 
-from . import models
+from . import authentication, models
+from .profiles import get_profiles, profile_cache
 
 
 class RegistrationSerializer(serializers.Serializer):
@@ -54,7 +59,9 @@ class UserDetailSerializer(serializers.ModelSerializer):
         if username and username != instance.username:
             if models.User.objects.filter(username=username).exists():
                 raise serializers.ValidationError(_("User already exists."))
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        profile_cache.delete(instance.pk)
+        return instance
 
 
 class UserMinimalSerializer(serializers.ModelSerializer):
@@ -63,6 +70,39 @@ class UserMinimalSerializer(serializers.ModelSerializer):
         fields = ("full_name", "username")
 
 
+class ProfileField(serializers.ReadOnlyField):
+    """
+    Profile of the user whose id is in `source` (e.g. "author_id"), taken
+    from user.profiles instead of serializing the user row.
+    """
+
+    def to_representation(self, user_id):
+        return get_profiles(self.context, [user_id]).get(user_id)
+
+
+def collect_user_ids(serializer, instances):
+    """Ids read by the ProfileFields of `serializer` and of its nested lists."""
+    user_ids = set()
+    for field in serializer.fields.values():
+        if isinstance(field, ProfileField):
+            user_ids.update(getattr(obj, field.source) for obj in instances)
+        elif isinstance(field, serializers.ListSerializer):
+            nested = [
+                item for obj in instances for item in getattr(obj, field.source).all()
+            ]
+            user_ids |= collect_user_ids(field.child, nested)
+    return user_ids
+
+
+class ProfileListSerializer(serializers.ListSerializer):
+    """Resolve the profiles of the whole list with at most one query."""
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, Manager) else data
+        get_profiles(self.context, collect_user_ids(self.child, items))
+        return super().to_representation(items)
+
+
 class PasswordChangeSerializer(serializers.Serializer):
     current_password = serializers.CharField(
         min_length=8,
@@ -76,3 +116,33 @@ class PasswordChangeSerializer(serializers.Serializer):
         write_only=True,
         style={"input_type": "password"},
     )
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return authentication.add_user_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Refresh the claims from the user row, and refuse refresh tokens issued
+    before the last password change or deactivation.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = models.User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+        if authentication.PASSWORD_CLAIM in refresh:
+            authentication.check_password_claim(
+                refresh, authentication.credentials_fingerprint(user)
+            )
+
+        access = authentication.add_user_claims(refresh.access_token, user)
+        return {"access": str(access)}
@@ -1,12 +1,18 @@
+import tempfile
+
+from base.testing import QueryBudgetTestCase
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from .profiles import get_profiles, profile_cache
+
 User = get_user_model()
 
 
-class UserAuthTestCase(TestCase):
+class UserAuthTestCase(QueryBudgetTestCase):
     def setUp(self):
         self.user_data = {
             "username": "demousername",
@@ -77,3 +83,121 @@ class UserAuthTestCase(TestCase):
         url = f"/api/v1/users/{user.username}/"
         response = self.client.get(url, format="json")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def get_tokens(self, password=None):
+        payload = {
+            "username": self.user_data["username"],
+            "password": password or self.user_data["password"],
+        }
+        return self.client.post("/api/v1/token/", payload, format="json").json()
+
+    def test_token_user_from_claims(self):
+        tokens = self.get_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # A cache shared between processes, as the Redis one
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": cache_dir.name,
+        }
+        with override_settings(CACHES={**settings.CACHES, "auth": shared}):
+            # Only the public profile lookup, no query for the request user
+            with self.assertNumQueries(1):
+                response = self.client.get(f"/api/v1/users/{self.base_user.username}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # With a cache local to the process, the credentials are checked too
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/v1/users/{self.base_user.username}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.json()["username"], self.user_data["username"])
+
+    def test_local_auth_cache_checks_credentials(self):
+        tokens = self.get_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # Changed by another process, this one's cache knows nothing about it
+        self.base_user.set_password("changepassword")
+        self.base_user.save()
+
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["code"], "token_revoked")
+
+        self.base_user.delete()
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()["code"], "user_not_found")
+
+    def test_change_password_revokes_tokens(self):
+        tokens = self.get_tokens()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        payload = {
+            "current_password": self.user_data["password"],
+            "new_password": "changepassword",
+        }
+        response = self.client.post("/api/v1/change-password/", payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(
+            "/api/v1/update-access-token/", {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        tokens = self.get_tokens(payload["new_password"])
+        response = self.client.post(
+            "/api/v1/update-access-token/", {"refresh": tokens["refresh"]}
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}"
+        )
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivation_revokes_tokens(self):
+        tokens = self.login(
+            self.client, self.user_data["username"], self.user_data["password"]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.base_user.is_active = False
+            self.base_user.save()
+
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post("/api/v1/posts/", {"title": "Post"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(
+            "/api/v1/update-access-token/", {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        """Reactivating lets new logins in"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.base_user.is_active = True
+            self.base_user.save()
+        self.login(self.client, self.user_data["username"], self.user_data["password"])
+        response = self.client.get("/api/v1/me/", format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_cache(self):
+        profile_cache.clear()
+        user_id = self.base_user.pk
+        with self.assertNumQueries(1):
+            profiles = get_profiles({}, [user_id])
+        self.assertEqual(profiles[user_id]["full_name"], self.user_data["full_name"])
+        with self.assertNumQueries(0):
+            get_profiles({}, [user_id])
+
+        """Updating the profile drops the cached one"""
+        self.client.force_authenticate(user=self.base_user)
+        response = self.client.patch("/api/v1/me/", {"full_name": "Change"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            profiles = get_profiles({}, [user_id])
+        self.assertEqual(profiles[user_id]["full_name"], "Change")
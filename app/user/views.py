@@ -1,5 +1,6 @@
 from typing import Any
 
+from base.async_views import AsyncReadMixin
 from base.paginations import DefaultPagination
 from rest_framework import filters as drf_filters
 from rest_framework import generics, mixins, status, viewsets
@@ -8,6 +9,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from . import models, serializers
+from .authentication import revoke_tokens
 
 
 class RegistrationAPIView(generics.GenericAPIView):
@@ -31,7 +33,8 @@ class UserViewSet(generics.RetrieveUpdateAPIView):
     serializer_class = serializers.UserDetailSerializer
 
     def get_object(self):
-        return self.request.user
+        # request.user only holds the token claims
+        return models.User.objects.get(pk=self.request.user.pk)
 
 
 class PasswordViewSet(viewsets.GenericViewSet):
@@ -45,21 +48,25 @@ class PasswordViewSet(viewsets.GenericViewSet):
         serializer = serializers.PasswordChangeSerializer(data=data)
         if serializer.is_valid():
             data = serializer.validated_data
-            user = self.request.user
+            user = models.User.objects.get(pk=self.request.user.pk)
             if user.check_password(data["current_password"]):
                 user.set_password(data["new_password"])
                 user.save()
+                revoke_tokens(user)
                 return Response(
                     status=status.HTTP_200_OK, data={"message": "Password changed"}
                 )
         return Response(status=status.HTTP_403_FORBIDDEN, data=serializer.errors)
 
 
-class UserListViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class UserListViewSet(
+    AsyncReadMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
     queryset = models.User.objects.all()
     permission_classes = [AllowAny]
     serializer_class = serializers.UserMinimalSerializer
     pagination_class = DefaultPagination
+    query_budget = {"retrieve": 2}
     lookup_field = "username"
     search_fields = ("username", "email", "full_name")
     filter_backends = [drf_filters.SearchFilter]